@@ -0,0 +1,24 @@
+# cluster_stats.py
+import multiprocessing
+
+
+class ClusterStats:
+    """Guild and member counts of every shard cluster, shared through one block of shared memory."""
+
+    def __init__(self, counts, cluster_id):
+        self.counts = counts  # multiprocessing.Array('q', clusters * 2): guilds, members per cluster
+        self.cluster_id = cluster_id
+
+    @staticmethod
+    def allocate(clusters):
+        return multiprocessing.Array('q', clusters * 2)
+
+    def publish(self, guilds, members):
+        with self.counts.get_lock():
+            self.counts[self.cluster_id * 2] = guilds
+            self.counts[self.cluster_id * 2 + 1] = members
+
+    def totals(self):
+        with self.counts.get_lock():
+            values = self.counts[:]
+        return sum(values[0::2]), sum(values[1::2])
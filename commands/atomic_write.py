@@ -0,0 +1,29 @@
+# atomic_write.py
+import os
+
+
+def cluster_path(path):
+    """Give each shard cluster its own copy of a file; unchanged outside launcher.py."""
+    # Clusters load such files once and rewrite them whole, so a shared copy would keep only
+    # what the last writer knew
+    cluster_id = os.getenv('CLUSTER_ID')
+    if not path or cluster_id is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.cluster{cluster_id}{ext}"
+
+
+def write_atomic(path, data):
+    """Replace the file at path with data so readers never see it half written; raises OSError."""
+    # Per-process name, so an overlapping write from another process never shares the temp file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
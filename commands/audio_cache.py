@@ -0,0 +1,267 @@
+# audio_cache.py
+import asyncio
+import logging
+import os
+import random
+import struct
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR')  # optional, enables the on-disk audio cache
+AUDIO_CACHE_BYTES = int(os.getenv('AUDIO_CACHE_BYTES', str(2 * 1024 ** 3)))
+AUDIO_CACHE_MAX_DURATION = int(os.getenv('AUDIO_CACHE_MAX_DURATION', '900'))  # longer tracks are never stored
+AUDIO_CACHE_WORKERS = int(os.getenv('AUDIO_CACHE_WORKERS', '2'))  # concurrent background downloads
+PART_STALE_AGE = 3600  # seconds without a write before a .part file counts as abandoned
+FFMPEG_RECONNECT = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+OGG_MAX_SEGMENTS = 255
+
+
+def _ogg_crc_table():
+    # Ogg uses the unreflected CRC-32 polynomial 0x04C11DB7, which zlib.crc32 does not implement
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def opus_samples(packet):
+    # Samples at 48 kHz in one Opus packet, read from its TOC byte (RFC 6716 section 3.1)
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame = (480, 960, 1920, 2880)[config % 4]
+    elif config < 16:
+        frame = (480, 960)[config % 2]
+    else:
+        frame = (120, 240, 480, 960)[config % 4]
+    code = toc & 3
+    frames = 1 if code == 0 else 2 if code < 3 else packet[1] & 0x3F
+    return frame * frames
+
+
+def ogg_page(serial, sequence, granule, flags, packets):
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b'\xff' * (len(packet) // 255)
+        lacing.append(len(packet) % 255)
+    header = struct.pack('<4sBBqIIIB', b'OggS', 0, flags, granule, serial, sequence, 0, len(lacing)) + lacing
+    body = b''.join(packets)
+    crc = ogg_crc(header + body)
+    return header[:22] + struct.pack('<I', crc) + header[26:] + body
+
+
+def write_ogg_opus(path, packets):
+    """Write Opus packets as demuxed by discord.py (OpusHead and OpusTags first) to an Ogg file."""
+    head, tags, audio = packets[0], packets[1], packets[2:]
+    serial = random.getrandbits(32)
+    with open(path, 'wb') as f:
+        f.write(ogg_page(serial, 0, 0, 0x02, [head]))
+        f.write(ogg_page(serial, 1, 0, 0, [tags]))
+        sequence, granule, page, segments = 2, 0, [], 0
+        for packet in audio:
+            needed = len(packet) // 255 + 1
+            if segments + needed > OGG_MAX_SEGMENTS:
+                f.write(ogg_page(serial, sequence, granule, 0, page))
+                sequence += 1
+                page, segments = [], 0
+            page.append(packet)
+            segments += needed
+            granule += opus_samples(packet)
+        f.write(ogg_page(serial, sequence, granule, 0x04, page))
+
+
+class AudioCache:
+    """Ogg/Opus copies of played tracks keyed by video ID, evicted LRU within a byte budget.
+
+    The directory may be shared by several shard cluster processes: downloads go to per-process
+    .part files and are moved into place atomically, so a reader only ever sees a finished file,
+    and the byte budget is enforced on the directory as a whole.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # video_id: size in bytes, least recently used first
+        self.total_bytes = 0
+        self.filling = {}  # video_id: Task
+        self.slots = None
+        self.hits = 0
+        self.misses = 0
+        if self.directory:
+            self.load()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def path_for(self, video_id):
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.entries, self.total_bytes = self.scan(clean_parts=True)
+        logger.info(f"Audio cache: {len(self.entries)} tracks, {self.total_bytes / 1024 ** 2:.0f} MB in {self.directory}")
+
+    def scan(self, clean_parts=False):
+        """Index the directory, including files other clusters sharing it added, and evict down to the budget.
+
+        Lists and stats every file, so outside of startup it runs on a worker thread. Returns
+        (entries, total_bytes) for the caller to install on the event loop.
+        """
+        files = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # finished or cleaned up by another cluster meanwhile
+            if name.endswith('.part'):
+                # Fresh ones are downloads another cluster is still writing
+                if clean_parts and now - stat.st_mtime > PART_STALE_AGE:
+                    try:
+                        os.unlink(path)  # left over from an interrupted download
+                    except OSError:
+                        pass
+            elif name.endswith('.opus'):
+                files.append((stat.st_mtime, name[:-5], stat.st_size))
+        # mtime is bumped on every hit by any cluster, so it orders the files by last use
+        entries = OrderedDict()
+        total_bytes = 0
+        for _, video_id, size in sorted(files):
+            entries[video_id] = size
+            total_bytes += size
+        while total_bytes > self.max_bytes and entries:
+            video_id, size = entries.popitem(last=False)
+            total_bytes -= size
+            try:
+                os.unlink(self.path_for(video_id))
+            except FileNotFoundError:
+                pass  # already evicted by another cluster
+            except OSError as e:
+                logger.error(f"Failed to evict {video_id} from audio cache: {e}")
+        return entries, total_bytes
+
+    def lookup(self, video_id):
+        if not self.enabled or not video_id:
+            return None
+        if video_id not in self.entries:
+            self.misses += 1
+            return None
+        path = self.path_for(video_id)
+        try:
+            os.utime(path)
+        except OSError:
+            self.forget(video_id)  # removed behind our back
+            self.misses += 1
+            return None
+        self.entries.move_to_end(video_id)
+        self.hits += 1
+        return path
+
+    def forget(self, video_id):
+        size = self.entries.pop(video_id, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def wanted(self, track):
+        if not self.enabled or not track.video_id or track.video_id in self.entries:
+            return False
+        return bool(track.duration) and track.duration <= AUDIO_CACHE_MAX_DURATION and track.video_id not in self.filling
+
+    def schedule(self, track):
+        """Start a background copy of a track that is about to play, if it qualifies."""
+        if track.is_opus or not track.url or not self.wanted(track):
+            return  # Opus tracks are stored from the packets recorded while they play, see store()
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(max(1, AUDIO_CACHE_WORKERS))
+        self.filling[track.video_id] = asyncio.create_task(self.fill(track))
+
+    async def adopt(self, video_id):
+        # The budget covers the whole directory, and our own totals miss what other clusters
+        # sharing it wrote since, so recount from the directory before evicting
+        self.entries, self.total_bytes = await asyncio.to_thread(self.scan)
+        return self.entries.get(video_id, 0)
+
+    async def fill(self, track):
+        path = self.path_for(track.video_id)
+        part_path = f"{path}.{os.getpid()}.part"
+        # Opus streams are only remuxed into Ogg, anything else is encoded once at Discord's rate
+        codec = ['-c:a', 'copy'] if track.is_opus else ['-c:a', 'libopus', '-b:a', '128k', '-ar', '48000', '-ac', '2']
+        process = None
+        try:
+            async with self.slots:
+                if os.path.exists(path):
+                    # Another cluster sharing the directory already cached it
+                    await self.adopt(track.video_id)
+                    return
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-nostdin', '-loglevel', 'error', *FFMPEG_RECONNECT, '-i', track.url,
+                    '-vn', '-map', '0:a:0', *codec, '-f', 'ogg', '-y', part_path,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise Exception(stderr.decode(errors='replace').strip() or f"ffmpeg exited with {process.returncode}")
+            os.replace(part_path, path)
+            size = await self.adopt(track.video_id)
+            logger.info(f"Cached {track.title} ({size / 1024 ** 2:.1f} MB)")
+        except asyncio.CancelledError:
+            if process and process.returncode is None:
+                process.kill()
+            raise
+        except Exception as e:
+            logger.error(f"Failed to cache {track.title}: {e}")
+        finally:
+            self.filling.pop(track.video_id, None)
+            if os.path.exists(part_path):
+                try:
+                    os.unlink(part_path)
+                except OSError:
+                    pass
+
+    def store(self, track, packets):
+        """Keep the Opus packets recorded while a track played, instead of downloading it again."""
+        if not self.wanted(track) or len(packets) < 3:
+            return
+        if not packets[0].startswith(b'OpusHead') or not packets[1].startswith(b'OpusTags'):
+            return
+        self.filling[track.video_id] = asyncio.create_task(self.write_recording(track, packets))
+
+    async def write_recording(self, track, packets):
+        path = self.path_for(track.video_id)
+        part_path = f"{path}.{os.getpid()}.part"
+        try:
+            await asyncio.to_thread(write_ogg_opus, part_path, packets)
+            os.replace(part_path, path)
+            size = await self.adopt(track.video_id)
+            logger.info(f"Cached {track.title} from its recording ({size / 1024 ** 2:.1f} MB)")
+        except Exception as e:
+            logger.error(f"Failed to cache {track.title}: {e}")
+        finally:
+            self.filling.pop(track.video_id, None)
+            if os.path.exists(part_path):
+                try:
+                    os.unlink(part_path)
+                except OSError:
+                    pass
+
+    def close(self):
+        for task in list(self.filling.values()):
+            task.cancel()
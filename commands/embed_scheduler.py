@@ -0,0 +1,170 @@
+# embed_scheduler.py
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Discord allows roughly 5 message edits per 5 s per channel and 50 requests per second globally;
+# the defaults stay well below that so command responses always have headroom.
+CHANNEL_EDITS_PER_WINDOW = 4
+CHANNEL_WINDOW = 5.0
+GLOBAL_EDITS_PER_SECOND = float(os.getenv('EMBED_EDITS_PER_SECOND', '10'))
+PRESSURE_PENDING = int(os.getenv('EMBED_PRESSURE_PENDING', '50'))  # backlog at which cosmetic edits are dropped
+BUCKET_IDLE_TTL = 300
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class PendingEdit:
+    __slots__ = ('message', 'kwargs', 'cosmetic')
+
+    def __init__(self, message, kwargs, cosmetic):
+        self.message = message
+        self.kwargs = kwargs
+        self.cosmetic = cosmetic
+
+
+class EmbedUpdateScheduler:
+    """Coalesces message edits per message and sends them within channel and global rate limits."""
+
+    def __init__(self):
+        self.pending = OrderedDict()  # message id: PendingEdit, oldest first
+        self.channel_buckets = {}  # channel id: TokenBucket
+        self.global_bucket = TokenBucket(GLOBAL_EDITS_PER_SECOND, GLOBAL_EDITS_PER_SECOND)
+        self.backoff_until = 0.0
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.pending.clear()
+
+    @property
+    def under_pressure(self):
+        return len(self.pending) >= PRESSURE_PENDING or time.monotonic() < self.backoff_until
+
+    def submit(self, message, cosmetic=False, **kwargs):
+        """Queue an edit, merging it into any edit still pending for the same message.
+
+        Cosmetic edits (colour cycling, progress bars) are dropped while the
+        scheduler is under pressure; returns False when that happens.
+        """
+        existing = self.pending.get(message.id)
+        if existing:
+            existing.kwargs.update(kwargs)
+            existing.cosmetic = existing.cosmetic and cosmetic
+            existing.message = message
+            return True
+        if cosmetic and self.under_pressure:
+            self.dropped += 1
+            return False
+        self.pending[message.id] = PendingEdit(message, dict(kwargs), cosmetic)
+        self.wakeup.set()
+        return True
+
+    def discard(self, message):
+        self.pending.pop(message.id, None)
+
+    def next_edit(self, now):
+        # Real updates go before cosmetic ones; each channel is limited separately
+        wait = None
+        for cosmetic in (False, True):
+            for edit in self.pending.values():
+                if edit.cosmetic != cosmetic:
+                    continue
+                bucket = self.channel_buckets.get(edit.message.channel.id)
+                delay = bucket.wait_time(now) if bucket else 0.0
+                if delay == 0.0:
+                    return edit, 0.0
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def shed_cosmetic(self):
+        for message_id in [k for k, v in self.pending.items() if v.cosmetic]:
+            del self.pending[message_id]
+            self.dropped += 1
+
+    def prune_buckets(self, now):
+        for channel_id in [k for k, b in self.channel_buckets.items() if now - b.updated > BUCKET_IDLE_TTL]:
+            del self.channel_buckets[channel_id]
+
+    async def run(self):
+        last_prune = time.monotonic()
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            now = time.monotonic()
+            if now < self.backoff_until:
+                await asyncio.sleep(self.backoff_until - now)
+                continue
+            if self.under_pressure:
+                self.shed_cosmetic()
+            edit, wait = self.next_edit(now)
+            if edit is None:
+                await asyncio.sleep(wait or 0.1)
+                continue
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait:
+                await asyncio.sleep(global_wait)
+                continue
+            self.pending.pop(edit.message.id, None)
+            self.global_bucket.consume()
+            channel_id = edit.message.channel.id
+            bucket = self.channel_buckets.get(channel_id)
+            if bucket is None:
+                bucket = self.channel_buckets[channel_id] = TokenBucket(
+                    CHANNEL_EDITS_PER_WINDOW / CHANNEL_WINDOW, CHANNEL_EDITS_PER_WINDOW
+                )
+                bucket.refill(now)
+            bucket.consume()
+            try:
+                await edit.message.edit(**edit.kwargs)
+                self.sent += 1
+            except discord.NotFound:
+                pass  # message was deleted, nothing left to update
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = getattr(e, 'retry_after', None) or 5.0
+                    self.backoff_until = time.monotonic() + retry_after
+                    logger.warning(f"Embed edits rate limited, backing off for {retry_after:.1f}s")
+                else:
+                    logger.error(f"Failed to edit message {edit.message.id}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to edit message {edit.message.id}: {e}")
+            if now - last_prune > BUCKET_IDLE_TTL:
+                self.prune_buckets(now)
+                last_prune = now
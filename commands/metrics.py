@@ -0,0 +1,136 @@
+# metrics.py
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 disables the endpoint; clusters use port + cluster id
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # set to 0.0.0.0 to expose it beyond this machine
+LAG_INTERVAL = 1.0  # seconds between event loop lag samples
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    # Cumulative buckets are only built when scraped, so observe() is one bisect and three adds
+    __slots__ = ('name', 'help', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, name, help, bounds=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Counter:
+    __slots__ = ('name', 'help', 'label', 'values')
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}  # label value (None when unlabelled): count
+
+    def inc(self, value=None, amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        if not self.values and self.label is None:
+            lines.append(f"{self.name} 0")
+        for value, count in sorted(self.values.items(), key=lambda item: str(item[0])):
+            labels = f'{{{self.label}="{value}"}}' if self.label is not None else ''
+            lines.append(f"{self.name}{labels} {count}")
+        return lines
+
+
+class Metrics:
+    """Counters and histograms fed from the music pipeline, plus gauges read only when scraped."""
+
+    def __init__(self):
+        self.source_latency = Histogram(
+            'vydra_get_audio_source_seconds', 'Time to resolve a query into a playable track.')
+        self.first_audio = Histogram(
+            'vydra_time_to_first_audio_seconds', 'Time from a track transition to its first audio frame being sent.')
+        self.transitions = Counter(
+            'vydra_track_transitions_total', 'Track transitions made by play_next, by result.', label='result')
+        self.play_errors = Counter(
+            'vydra_play_next_errors_total', 'Tracks that failed to start in play_next.')
+        self.playback_errors = Counter(
+            'vydra_playback_errors_total', 'Errors reported by the voice client when a track ended.')
+        self.gauges = []  # (name, help, type, callable returning a number)
+        self.loop_lag = 0.0
+        self.lag_task = None
+        self.runner = None
+
+    def gauge(self, name, help, read, kind='gauge'):
+        # Read when scraped; kind='counter' for running totals kept elsewhere
+        self.gauges.append((name, help, kind, read))
+
+    def render(self):
+        lines = []
+        for metric in (self.source_latency, self.first_audio, self.transitions, self.play_errors, self.playback_errors):
+            lines.extend(metric.render())
+        for name, help, kind, read in self.gauges:
+            try:
+                value = read()
+            except Exception as e:
+                logger.error(f"Failed to read metric {name}: {str(e)}")
+                continue
+            lines.extend((f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"))
+        return "\n".join(lines) + "\n"
+
+    async def measure_loop_lag(self):
+        # How late a sleep wakes up is how long callbacks waited behind other work
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.perf_counter() - start - LAG_INTERVAL)
+
+    async def handle(self, request):
+        return web.Response(
+            body=self.render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def start(self, port):
+        self.gauge('vydra_event_loop_lag_seconds', 'Delay of the last event loop lag sample.', lambda: self.loop_lag)
+        self.lag_task = asyncio.create_task(self.measure_loop_lag())
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, METRICS_HOST, port).start()
+        logger.info(f"Serving metrics on {METRICS_HOST}:{port}/metrics")
+
+    def stop(self):
+        # Called from the synchronous cog_unload, so the server is closed in the background
+        if self.lag_task:
+            self.lag_task.cancel()
+            self.lag_task = None
+        if self.runner:
+            asyncio.create_task(self.runner.cleanup())
+            self.runner = None
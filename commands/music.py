@@ -1,26 +1,462 @@
 # music.py
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 import yt_dlp
 import asyncio
 import logging
 from discord.ui import Button, View
+from discord.utils import MISSING
 import random
 import os
 import tempfile
 import base64
+import itertools
+import json
+import re
+import subprocess
+import time
+import weakref
+from dataclasses import dataclass
+from commands.resolver import ResolverPool, ResolverBusy, YoutubeDLPool
+from commands.track_cache import TrackCache, EXPIRY_MARGIN
+from commands.embed_scheduler import EmbedUpdateScheduler
+from commands.track_queue import TrackQueue, QueueFull, DuplicateTrack, QUEUE_MAX_LENGTH
+from commands.search_index import SearchIndex
+from commands.audio_cache import AudioCache
+from commands.packet_buffer import PacketBudget, PacketBuffer, BufferedOpus, FRAME_LENGTH
+from commands.state_store import StateStore, STATE_FLUSH_INTERVAL
+from commands.metrics import Metrics, METRICS_PORT
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FFMPEG_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+PREFETCH_SECONDS = int(os.getenv('PREFETCH_SECONDS', '15'))  # how early the next track is warmed up
+SEEK_STEP = 10  # seconds skipped by the forward/rewind buttons
+ANIMATION_INTERVAL = float(os.getenv('ANIMATION_INTERVAL', '5'))  # seconds between now-playing refreshes
+QUEUE_PAGE_SIZE = 10
+BATCH_MAX_QUERIES = 25
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))  # lookups one !playmany runs at a time
+PLAYLIST_CHUNK_SIZE = 25  # flat entries pulled per resolver job while a playlist streams in
+PLAYLIST_RE = re.compile(r'[?&]list=|/playlist\b|/sets/')
+QUEUE_VIEW_TIMEOUT = 180
+EMPTY_CHANNEL_GRACE = float(os.getenv('EMPTY_CHANNEL_GRACE', '60'))  # seconds alone before leaving voice
+IDLE_TIMEOUT = float(os.getenv('IDLE_TIMEOUT', '600'))  # seconds with nothing playing before a player is freed
+PAUSED_TIMEOUT = float(os.getenv('PAUSED_TIMEOUT', '1800'))  # same, for a player left paused
+REAPER_INTERVAL = 60
+ORPHAN_SOURCE_AGE = 60  # sources younger than this may still be on their way to a voice client
+ANIMATION_COLORS = [
+    discord.Color.red(),
+    discord.Color.orange(),
+    discord.Color.yellow(),
+    discord.Color.green(),
+    discord.Color.blue(),
+    discord.Color.purple(),
+]
+
+def parse_timestamp(value):
+    # Accepts ss, mm:ss or hh:mm:ss
+    seconds = 0
+    for part in value.strip().split(':'):
+        if not part.isdigit():
+            raise ValueError(f"Invalid timestamp: {value}")
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def format_timestamp(seconds):
+    mins, secs = divmod(int(seconds), 60)
+    hours, mins = divmod(mins, 60)
+    return f"{hours}:{mins:02d}:{secs:02d}" if hours else f"{mins}:{secs:02d}"
+
+def progress_bar(elapsed, duration, width=16):
+    filled = min(width - 1, int(width * elapsed / duration)) if duration else 0
+    return "▬" * filled + "🔘" + "▬" * (width - filled - 1)
+
+def is_playlist_query(query):
+    # Playlists and mixes (watch?v=...&list=RD...) are both recognised by their list id
+    return query.startswith(('http://', 'https://')) and PLAYLIST_RE.search(query) is not None
+
+def parse_batch_queries(text):
+    # One query per line or separated by |; slash command options are single-line so they need |
+    queries = [q.strip() for q in re.split(r'[\n|]', text)]
+    return [q for q in queries if q][:BATCH_MAX_QUERIES]
+
+def take_entries(iterator, count):
+    # Pulling from yt-dlp's lazy entry generator may fetch the next page, so run it on a resolver thread
+    return list(itertools.islice(iterator, count))
+
+@dataclass(frozen=True, slots=True)
+class Track:
+    # Queue entries stay lightweight; the ffmpeg source is only built in play_next
+    title: str
+    url: str
+    query: str
+    video_id: str = None
+    thumbnail: str = None
+    duration: int = None
+    expires_at: float = 0.0
+    codec: str = None
+    sample_rate: int = None
+
+    @classmethod
+    def from_info(cls, query, info):
+        return cls(
+            title=info['title'],
+            url=info['url'],
+            query=query,
+            video_id=info.get('id'),
+            thumbnail=info.get('thumbnail'),
+            duration=info.get('duration'),
+            expires_at=info.get('expires_at', 0.0),
+            codec=info.get('acodec'),
+            sample_rate=info.get('asr'),
+        )
+
+    @classmethod
+    def from_flat_entry(cls, entry):
+        # Flat playlist entries carry no stream URL; expires_at=0 makes create_source resolve it on demand
+        video_id = entry.get('id')
+        query = entry.get('url') or (f"https://www.youtube.com/watch?v={video_id}" if video_id else None)
+        if not query:
+            return None
+        return cls(
+            title=entry.get('title') or 'Unknown Title',
+            url='',
+            query=query,
+            video_id=video_id if entry.get('ie_key', 'Youtube') == 'Youtube' else None,
+            duration=entry.get('duration'),
+        )
+
+    def to_state(self):
+        # Stream URLs expire within hours, so restored tracks are resolved again when played
+        return [self.title, self.query, self.video_id, self.thumbnail, self.duration, self.codec, self.sample_rate]
+
+    @classmethod
+    def from_state(cls, state):
+        title, query, video_id, thumbnail, duration, codec, sample_rate = state
+        return cls(
+            title=title,
+            url='',
+            query=query,
+            video_id=video_id,
+            thumbnail=thumbnail,
+            duration=duration,
+            codec=codec,
+            sample_rate=sample_rate,
+        )
+
+    @property
+    def expired(self):
+        return self.expires_at - EXPIRY_MARGIN <= time.time()
+
+    @property
+    def is_opus(self):
+        # Discord voice is 48 kHz Opus, so such streams can skip transcoding
+        return self.codec == 'opus' and self.sample_rate in (None, 48000)
+
+    @property
+    def source_query(self):
+        if self.video_id:
+            return f"https://www.youtube.com/watch?v={self.video_id}"
+        return self.query
+
+class TrackSource(discord.AudioSource):
+    # Wraps a track's ffmpeg pipeline so it can be started and primed before it plays
+    live = weakref.WeakSet()  # every source not yet garbage collected, checked by the idle reaper
+
+    def __init__(self, original, offset=0.0):
+        self.original = original
+        self.primed = None
+        self.offset = offset  # seconds into the track where ffmpeg started
+        self.frames = 0  # 20 ms frames handed to the voice client
+        self.buffer = None  # PacketBuffer this source records into
+        self.on_first_frame = None  # called from the audio thread when the first frame goes out
+        self.created_at = time.monotonic()
+        TrackSource.live.add(self)
+
+    def prime(self):
+        # Blocks until ffmpeg produced its first frame, call it off the event loop
+        if self.primed is None:
+            self.primed = self.original.read()
+
+    def read(self):
+        if self.primed is not None:
+            data, self.primed = self.primed, None
+        else:
+            data = self.original.read()
+        if data:
+            self.frames += 1
+            if self.on_first_frame:
+                callback, self.on_first_frame = self.on_first_frame, None
+                callback()
+        if self.buffer is not None and self.buffer.recorder is self:
+            if data:
+                self.buffer.append(data)
+            else:
+                self.buffer.finish(self.exited_cleanly())
+        return data
+
+    def exited_cleanly(self):
+        # Called on EOF from the audio thread; ffmpeg may still be flushing, so give it a moment
+        process = getattr(self.original, '_process', None)
+        try:
+            return process is not None and process.wait(timeout=1) == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def start_recording(self, buffer):
+        # Only passthrough sources produce the Opus packets that are sent, so only they are recorded
+        self.buffer = buffer
+        buffer.recorder = self
+
+    def skip_frames(self, count):
+        # Used to catch a replacement pipeline up with the one it replaces
+        for _ in range(count):
+            if not self.read():
+                break
+
+    @property
+    def position(self):
+        return self.offset + self.frames * 0.02
+
+    @property
+    def passthrough(self):
+        return not isinstance(self.original, discord.PCMVolumeTransformer)
+
+    @property
+    def running(self):
+        # True while the ffmpeg process behind this source is still alive
+        original = self.original
+        if isinstance(original, discord.PCMVolumeTransformer):
+            original = original.original
+        process = getattr(original, '_process', None)
+        poll = getattr(process, 'poll', None)
+        return poll is not None and poll() is None
+
+    @property
+    def volume(self):
+        return 1.0 if self.passthrough else self.original.volume
+
+    @volume.setter
+    def volume(self, value):
+        # Applied by PCMVolumeTransformer to the next frame, ffmpeg keeps running
+        if self.passthrough:
+            raise ValueError("Passthrough sources have no volume control")
+        self.original.volume = value
+
+    def is_opus(self):
+        return self.original.is_opus()
+
+    def cleanup(self):
+        if self.buffer is not None and self.buffer.recorder is self:
+            self.buffer.recorder = None
+        self.original.cleanup()
+
+class GuildPlayer:
+    # Everything the bot keeps for one guild; teardown() releases all of it in one call
+    __slots__ = (
+        'guild_id', 'queue', 'current', 'voice_client', 'text_channel', 'loop_mode', 'volume',
+        'message', 'animation_task', 'prefetch_task', 'prefetched', 'volume_switching', 'lock',
+        'playlist_task', 'loop_task', 'wakeup', 'finished', 'playback_error', 'buffer',
+        'resume_position', 'listeners', 'empty_task', 'view', 'controls', 'last_active',
+    )
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.queue = TrackQueue()
+        self.current = None  # Track
+        self.voice_client = None
+        self.text_channel = None
+        self.loop_mode = 0  # 0(off), 1(single), 2(queue)
+        self.volume = 1.0  # 0.0 - 2.0
+        self.message = None  # now-playing panel
+        self.animation_task = None
+        self.prefetch_task = None
+        self.prefetched = None  # (queued Track, resolved Track, TrackSource)
+        self.volume_switching = False  # switching from passthrough to transcoding
+        self.lock = asyncio.Lock()  # serializes track transitions and source swaps
+        self.playlist_task = None  # background playlist ingestion
+        self.loop_task = None  # MusicCog.player_loop for this guild
+        self.wakeup = asyncio.Event()  # set when tracks are queued while idle
+        self.finished = asyncio.Event()  # set from the audio thread when a track ends
+        self.playback_error = None
+        self.buffer = None  # PacketBuffer of the current track
+        self.resume_position = 0.0  # where the next track starts, set when restoring after a restart
+        self.listeners = 0  # humans in the bot's voice channel, kept from voice state events
+        self.empty_task = None  # pending auto-disconnect while nobody is listening
+        self.view = None  # AnimatedMusicControls attached to the panel
+        self.controls = None  # (message, view) of the latest !controls panel
+        self.last_active = time.monotonic()  # last time something was playing or queued
+
+    @property
+    def connected(self):
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    @property
+    def source(self):
+        if self.voice_client and isinstance(self.voice_client.source, TrackSource):
+            return self.voice_client.source
+        return None
+
+    def swap_source(self, source):
+        # Replaces the playing source in place; the voice client's setter also resumes a paused player
+        voice_client = self.voice_client
+        paused = voice_client.is_paused()
+        if not source.passthrough and voice_client.encoder is MISSING:
+            # play() only creates the encoder when the first source needs one
+            voice_client.encoder = discord.opus.Encoder()
+        voice_client.source = source
+        if paused:
+            voice_client.pause()
+
+    def elapsed(self):
+        # Counted from frames actually sent, so pauses and stalls don't advance it
+        source = self.source
+        return source.position if source else 0.0
+
+    def buffered(self, track):
+        # A fully recorded track can be replayed from memory, but only at the volume it was recorded at
+        return (self.buffer is not None and self.buffer.complete and self.volume == 1.0
+                and self.buffer.key == TrackQueue.key_for(track))
+
+    def recording(self, track):
+        # The current pass is still being recorded and will be replayable once it ends
+        buffer = self.buffer
+        return (buffer is not None and buffer.recorder is not None and self.volume == 1.0
+                and buffer.key == TrackQueue.key_for(track))
+
+    def release_buffer(self):
+        if self.buffer:
+            self.buffer.release()
+            self.buffer = None
+
+    def fingerprint(self):
+        # Cheap to compute every flush; any difference means the row has to be rewritten
+        return (
+            self.queue.version, self.loop_mode, self.volume, self.queue.max_length,
+            id(self.current), self.voice_client.channel.id, getattr(self.text_channel, 'id', None),
+        )
+
+    def to_row(self):
+        return (
+            self.guild_id,
+            self.voice_client.channel.id,
+            getattr(self.text_channel, 'id', None),
+            self.loop_mode,
+            self.volume,
+            self.queue.max_length,
+            json.dumps(self.current.to_state()) if self.current else None,
+            self.elapsed(),
+            json.dumps([track.to_state() for track in self.queue]),
+            time.time(),
+        )
+
+    def upcoming_track(self):
+        if self.loop_mode == 1 and self.current:
+            return self.current
+        if self.queue:
+            return self.queue[0]
+        if self.loop_mode == 2 and self.current:
+            return self.current
+        return None
+
+    def cancel_prefetch(self):
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = None
+        if self.prefetched:
+            self.prefetched[2].cleanup()
+            self.prefetched = None
+
+    def cancel_playlist(self):
+        if self.playlist_task and not self.playlist_task.done():
+            self.playlist_task.cancel()
+            return True
+        return False
+
+    def cancel_loop(self):
+        if self.loop_task and not self.loop_task.done():
+            self.loop_task.cancel()
+        self.loop_task = None
+
+    def cancel_empty_timer(self):
+        if self.empty_task and not self.empty_task.done():
+            self.empty_task.cancel()
+        self.empty_task = None
+
+    def cancel_animation(self):
+        if self.animation_task and not self.animation_task.done():
+            self.animation_task.cancel()
+        self.animation_task = None
+
+    def owned_sources(self):
+        # Sources this player still plays or is about to play; anything else is an orphan
+        sources = []
+        source = self.source
+        if source:
+            sources.append(source)
+            if isinstance(source.original, BufferedOpus) and source.original.continuation:
+                sources.append(source.original.continuation)
+        if self.prefetched:
+            sources.append(self.prefetched[2])
+        return sources
+
+    def stop_view(self):
+        # Views without a timeout stay in the client's view store until stopped
+        if self.view:
+            self.view.stop()
+            self.view = None
+
+    async def delete_message(self):
+        self.stop_view()
+        if self.message:
+            try:
+                await self.message.delete()
+            except:
+                pass
+            self.message = None
+
+    async def delete_controls(self):
+        if self.controls:
+            message, view = self.controls
+            self.controls = None
+            view.stop()
+            try:
+                await message.delete()
+            except:
+                pass
+
+    async def reset(self):
+        # Stop playback and forget the queue but keep the connection and settings
+        await self.delete_message()
+        self.cancel_playlist()
+        self.cancel_animation()
+        self.cancel_prefetch()
+        self.release_buffer()
+        self.queue.clear()
+        self.current = None
+        if self.connected:
+            self.voice_client.stop()
+
+    async def teardown(self):
+        self.cancel_loop()
+        self.cancel_empty_timer()
+        await self.reset()
+        await self.delete_controls()
+        if self.voice_client and self.voice_client.is_connected():
+            await self.voice_client.disconnect()
+        self.voice_client = None
+        self.text_channel = None
+
 class AnimatedMusicControls(View):
     def __init__(self, cog, guild_id):
         super().__init__(timeout=None)
         self.cog = cog
         self.guild_id = guild_id
         self.is_playing = False
-        
+
         # Custom button styles with emojis
         self.play_button = Button(label="Play", style=discord.ButtonStyle.green, emoji="▶️")
         self.play_button.callback = self.play_button_callback
@@ -43,6 +479,12 @@ class AnimatedMusicControls(View):
         self.loop_button = Button(label="Loop", style=discord.ButtonStyle.green, emoji="🔁")
         self.loop_button.callback = self.loop_button_callback
 
+        self.rewind_button = Button(label=f"-{SEEK_STEP}s", style=discord.ButtonStyle.grey, emoji="⏪")
+        self.rewind_button.callback = self.rewind_button_callback
+
+        self.forward_button = Button(label=f"+{SEEK_STEP}s", style=discord.ButtonStyle.grey, emoji="⏩")
+        self.forward_button.callback = self.forward_button_callback
+
         # Set rows for responsive layout
         self.play_button.row = 0
         self.pause_button.row = 0
@@ -51,6 +493,8 @@ class AnimatedMusicControls(View):
         self.volume_down_button.row = 1
         self.volume_up_button.row = 1
         self.loop_button.row = 1
+        self.rewind_button.row = 1
+        self.forward_button.row = 1
 
         # Add items after setting rows
         self.add_item(self.play_button)
@@ -60,17 +504,24 @@ class AnimatedMusicControls(View):
         self.add_item(self.volume_down_button)
         self.add_item(self.volume_up_button)
         self.add_item(self.loop_button)
+        self.add_item(self.rewind_button)
+        self.add_item(self.forward_button)
+
+    @property
+    def voice_client(self):
+        player = self.cog.players.get(self.guild_id)
+        return player.voice_client if player else None
 
     async def update_button_states(self, interaction: discord.Interaction):
-        voice_client = self.cog.voice_clients.get(self.guild_id)
+        voice_client = self.voice_client
         self.is_playing = voice_client and voice_client.is_playing()
-        
+
         self.play_button.disabled = self.is_playing
         self.pause_button.disabled = not self.is_playing
         await interaction.response.edit_message(view=self)
 
     async def play_button_callback(self, interaction: discord.Interaction):
-        voice_client = self.cog.voice_clients.get(self.guild_id)
+        voice_client = self.voice_client
         if voice_client and voice_client.is_paused():
             voice_client.resume()
             await interaction.response.send_message("Resumed playback", ephemeral=True)
@@ -79,7 +530,7 @@ class AnimatedMusicControls(View):
             await interaction.response.send_message("Nothing is paused", ephemeral=True)
 
     async def pause_button_callback(self, interaction: discord.Interaction):
-        voice_client = self.cog.voice_clients.get(self.guild_id)
+        voice_client = self.voice_client
         if voice_client and voice_client.is_playing():
             voice_client.pause()
             await interaction.response.send_message("Paused playback", ephemeral=True)
@@ -88,7 +539,7 @@ class AnimatedMusicControls(View):
             await interaction.response.send_message("Nothing is playing", ephemeral=True)
 
     async def skip_button_callback(self, interaction: discord.Interaction):
-        voice_client = self.cog.voice_clients.get(self.guild_id)
+        voice_client = self.voice_client
         if voice_client:
             voice_client.stop()
             await interaction.response.send_message("Skipped to next track", ephemeral=True)
@@ -101,37 +552,368 @@ class AnimatedMusicControls(View):
         await interaction.response.send_message("Stopped playback and cleared queue", ephemeral=True)
         await self.update_button_states(interaction)
 
+    async def change_volume(self, interaction: discord.Interaction, delta):
+        # Leaving passthrough starts a new pipeline, which can take longer than the 3 s interaction window
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            player = self.cog.get_player(self.guild_id)
+            player.volume = max(0.0, min(2.0, player.volume + delta))
+            await self.cog.update_volume(player)
+            await interaction.followup.send(f"Volume: {player.volume * 100:.0f}%", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+
     async def volume_up_button_callback(self, interaction: discord.Interaction):
-        self.cog.volumes[self.guild_id] = min(2.0, self.cog.volumes.get(self.guild_id, 1.0) + 0.1)
-        await self.cog.update_volume(self.guild_id)
-        await interaction.response.send_message(f"Volume: {self.cog.volumes[self.guild_id] * 100:.0f}%", ephemeral=True)
+        await self.change_volume(interaction, 0.1)
 
     async def volume_down_button_callback(self, interaction: discord.Interaction):
-        self.cog.volumes[self.guild_id] = max(0.0, self.cog.volumes.get(self.guild_id, 1.0) - 0.1)
-        await self.cog.update_volume(self.guild_id)
-        await interaction.response.send_message(f"Volume: {self.cog.volumes[self.guild_id] * 100:.0f}%", ephemeral=True)
+        await self.change_volume(interaction, -0.1)
 
     async def loop_button_callback(self, interaction: discord.Interaction):
-        current_mode = self.cog.loop_modes.get(self.guild_id, 0)
-        next_mode = (current_mode + 1) % 3
+        player = self.cog.get_player(self.guild_id)
+        next_mode = (player.loop_mode + 1) % 3
         modes = {0: "Off", 1: "Single", 2: "Queue"}
-        self.cog.loop_modes[self.guild_id] = next_mode
+        player.loop_mode = next_mode
+        self.cog.queue_changed(player)
         self.loop_button.label = f"Loop {modes[next_mode]}"
         await interaction.response.send_message(f"Loop mode: {modes[next_mode]}", ephemeral=True)
-        await interaction.message.edit(view=self)
+        self.cog.ui_scheduler.submit(interaction.message, view=self)
+
+    async def seek_by(self, interaction: discord.Interaction, delta):
+        # Starting the new pipeline can take longer than the 3 s interaction window
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            player = self.cog.get_player(self.guild_id)
+            position = await self.cog.seek_to(player, player.elapsed() + delta)
+            await interaction.followup.send(f"Position: {format_timestamp(position)}", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+
+    async def rewind_button_callback(self, interaction: discord.Interaction):
+        await self.seek_by(interaction, -SEEK_STEP)
+
+    async def forward_button_callback(self, interaction: discord.Interaction):
+        await self.seek_by(interaction, SEEK_STEP)
+
+class QueueView(View):
+    # Renders one page of the queue at a time; the owner's buttons edit the same message
+    def __init__(self, cog, guild_id, owner_id, page=0):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.cog = cog
+        self.guild_id = guild_id
+        self.owner_id = owner_id  # member who asked for this queue message
+        self.page = page
+        self.message = None
+
+        self.previous_button = Button(label="Previous", style=discord.ButtonStyle.grey, emoji="◀️")
+        self.previous_button.callback = self.previous_button_callback
+
+        self.next_button = Button(label="Next", style=discord.ButtonStyle.grey, emoji="▶️")
+        self.next_button.callback = self.next_button_callback
+
+        self.add_item(self.previous_button)
+        self.add_item(self.next_button)
+
+    @property
+    def queue(self):
+        player = self.cog.players.get(self.guild_id)
+        return player.queue if player else None
+
+    def build_embed(self):
+        queue = self.queue
+        if not queue:
+            self.previous_button.disabled = self.next_button.disabled = True
+            return discord.Embed(title="Current Queue", description="Antrian kosong.", color=discord.Color.blue())
+        pages = (len(queue) + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE
+        self.page = max(0, min(self.page, pages - 1))  # the queue may have shrunk since the last render
+        start = self.page * QUEUE_PAGE_SIZE
+        lines = []
+        for i, song in enumerate(queue.page(start, start + QUEUE_PAGE_SIZE), start=start + 1):
+            title = song.title if len(song.title) <= 80 else song.title[:77] + "..."
+            length = format_timestamp(song.duration) if song.duration else "live"
+            lines.append(f"{i}. {title} `{length}`")
+        total = format_timestamp(queue.total_duration)
+        if queue.unknown_durations:
+            total += f" + {queue.unknown_durations} live"
+        embed = discord.Embed(title="Current Queue", description="\n".join(lines), color=discord.Color.blue())
+        embed.set_footer(text=f"Page {self.page + 1}/{pages} • {len(queue)} tracks • Total {total}")
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.page >= pages - 1
+        return embed
+
+    async def send_ephemeral(self, interaction: discord.Interaction):
+        await interaction.response.send_message(embed=self.build_embed(), view=self, ephemeral=True)
+        self.message = await interaction.original_response()
+
+    async def turn_page(self, interaction: discord.Interaction, delta):
+        if interaction.user.id != self.owner_id:
+            # Someone else's queue message: page a private copy instead of changing it for everyone
+            await QueueView(self.cog, self.guild_id, interaction.user.id, self.page + delta).send_ephemeral(interaction)
+            return
+        self.page += delta
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    async def previous_button_callback(self, interaction: discord.Interaction):
+        await self.turn_page(interaction, -1)
+
+    async def next_button_callback(self, interaction: discord.Interaction):
+        await self.turn_page(interaction, 1)
+
+    async def on_timeout(self):
+        if self.message:
+            self.cog.ui_scheduler.submit(self.message, view=None)
+
+class PlaylistView(View):
+    def __init__(self, cog, guild_id):
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.guild_id = guild_id
+
+        self.cancel_button = Button(label="Cancel", style=discord.ButtonStyle.red, emoji="✖️")
+        self.cancel_button.callback = self.cancel_button_callback
+        self.add_item(self.cancel_button)
+
+    async def cancel_button_callback(self, interaction: discord.Interaction):
+        player = self.cog.players.get(self.guild_id)
+        if player and player.cancel_playlist():
+            await interaction.response.send_message("Stopped loading the playlist", ephemeral=True)
+        else:
+            await interaction.response.send_message("No playlist is loading", ephemeral=True)
 
 class MusicCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.queues = {}  # guild_id: list of {'title': str, 'source': FFmpegOpusAudio, 'thumbnail': str, 'duration': int, 'url': str}
-        self.currents = {}  # guild_id: {'title': str, 'source': FFmpegOpusAudio, 'thumbnail': str, 'duration': int, 'url': str}
-        self.voice_clients = {}  # guild_id: VoiceClient
-        self.loop_modes = {}  # guild_id: 0(off), 1(single), 2(queue)
-        self.volumes = {}  # guild_id: float (0.0 - 2.0)
-        self.play_messages = {}  # guild_id: Message
-        self.animation_tasks = {}  # guild_id: Task for animation
-
-    async def write_cookies_file(self):
+        self.players = {}  # guild_id: GuildPlayer
+        self.channel_players = {}  # voice channel id: GuildPlayer connected to it
+        self.ui_scheduler = EmbedUpdateScheduler()
+        self.resolver = ResolverPool()
+        self.track_cache = TrackCache()
+        self.search_index = SearchIndex()
+        self.audio_cache = AudioCache()
+        self.packet_budget = PacketBudget()
+        self.state_store = StateStore()
+        self.metrics = Metrics()
+        self.restore_task = None
+        self.cookies_path = None
+        self.ydl_pool = YoutubeDLPool(self.create_youtube_dl, size=self.resolver.workers)
+
+    def get_player(self, guild_id):
+        player = self.players.get(guild_id)
+        if player is None:
+            player = self.players[guild_id] = GuildPlayer(guild_id)
+        return player
+
+    def connected_player(self, guild_id):
+        player = self.players.get(guild_id)
+        return player if player and player.connected else None
+
+    async def destroy_player(self, guild_id):
+        player = self.players.pop(guild_id, None)
+        if player:
+            await player.teardown()
+
+    async def cog_load(self):
+        # Cookies are decoded once and shared by every pooled YoutubeDL instance
+        try:
+            self.cookies_path = self.write_cookies_file()
+            await asyncio.to_thread(self.ydl_pool.warm_up)
+            logger.info(f"Initialized {len(self.ydl_pool.instances)} YoutubeDL instances")
+        except Exception as e:
+            logger.error(f"Failed to prepare yt-dlp: {str(e)}")
+        if self.track_cache.path or self.search_index.path:
+            self.save_caches.start()
+        self.ui_scheduler.start()
+        self.reap_idle_players.start()
+        if self.state_store.enabled:
+            try:
+                await asyncio.to_thread(self.state_store.open)
+                self.restore_task = asyncio.create_task(self.restore_state())
+            except Exception as e:
+                logger.error(f"Failed to open state store {self.state_store.path}: {str(e)}")
+        if METRICS_PORT:
+            self.register_gauges()
+            port = METRICS_PORT + int(os.getenv('CLUSTER_ID', '0'))
+            try:
+                await self.metrics.start(port)
+            except Exception as e:
+                logger.error(f"Failed to start metrics endpoint on port {port}: {str(e)}")
+
+    def cog_unload(self):
+        if self.restore_task and not self.restore_task.done():
+            self.restore_task.cancel()
+        if self.persist_state.is_running():
+            # Last flush happens before the voice connections go away
+            self.persist_state.cancel()
+            self.state_store.write(*self.collect_state())
+        self.state_store.close()
+        for player in self.players.values():
+            player.cancel_empty_timer()
+            player.cancel_loop()
+            player.cancel_playlist()
+            player.cancel_prefetch()
+            player.cancel_animation()
+        self.ui_scheduler.stop()
+        self.reap_idle_players.cancel()
+        self.metrics.stop()
+        self.save_caches.cancel()
+        self.track_cache.save()
+        self.search_index.save()
+        self.resolver.shutdown()
+        self.ydl_pool.close()
+        self.audio_cache.close()
+        self.delete_cookies_file()
+
+    def register_gauges(self):
+        # Everything here is computed on scrape, nothing is updated on the playback path
+        metrics = self.metrics
+        metrics.gauge('vydra_voice_clients', 'Connected voice clients.',
+                      lambda: sum(1 for player in self.players.values() if player.connected))
+        metrics.gauge('vydra_players', 'Guild players held in memory.', lambda: len(self.players))
+        metrics.gauge('vydra_queued_tracks', 'Tracks waiting in all guild queues.',
+                      lambda: sum(len(player.queue) for player in self.players.values()))
+        metrics.gauge('vydra_queue_length_max', 'Length of the longest guild queue.',
+                      lambda: max((len(player.queue) for player in self.players.values()), default=0))
+        metrics.gauge('vydra_ffmpeg_processes', 'Running ffmpeg playback pipelines.',
+                      lambda: sum(1 for source in list(TrackSource.live) if source.running))
+        metrics.gauge('vydra_audio_cache_fills', 'Tracks being written to the audio cache.',
+                      lambda: len(self.audio_cache.filling))
+        metrics.gauge('vydra_embed_edits_total', 'Message edits sent by the embed scheduler.',
+                      lambda: self.ui_scheduler.sent, kind='counter')
+        metrics.gauge('vydra_embed_edits_dropped_total', 'Cosmetic edits dropped under rate limit pressure.',
+                      lambda: self.ui_scheduler.dropped, kind='counter')
+        metrics.gauge('vydra_embed_edits_pending', 'Edits waiting in the embed scheduler.',
+                      lambda: len(self.ui_scheduler.pending))
+        metrics.gauge('vydra_packet_buffer_bytes', 'Memory held by recorded Opus packets.',
+                      lambda: self.packet_budget.used)
+
+    @tasks.loop(minutes=5)
+    async def save_caches(self):
+        for cache in (self.track_cache, self.search_index):
+            data = cache.snapshot()
+            if data is not None:
+                await asyncio.to_thread(cache.write, data)
+
+    @tasks.loop(seconds=REAPER_INTERVAL)
+    async def reap_idle_players(self):
+        now = time.monotonic()
+        players = messages = buffered = 0
+        for guild_id, player in list(self.players.items()):
+            vc = player.voice_client
+            busy = (vc is not None and vc.is_playing()) or player.lock.locked() or (
+                player.playlist_task is not None and not player.playlist_task.done())
+            if busy:
+                player.last_active = now
+                continue
+            paused = vc is not None and vc.is_paused()
+            if now - player.last_active < (PAUSED_TIMEOUT if paused else IDLE_TIMEOUT):
+                continue
+            messages += (player.message is not None) + (player.controls is not None)
+            buffered += player.buffer.size if player.buffer else 0
+            players += 1
+            logger.info(f"Freeing idle player in guild {guild_id} (connected: {player.connected}, paused: {paused})")
+            await self.destroy_player(guild_id)
+
+        # ffmpeg pipelines nobody will read from again, e.g. left behind by a failed swap
+        owned = {id(source) for player in self.players.values() for source in player.owned_sources()}
+        killed = 0
+        for source in list(TrackSource.live):
+            if id(source) in owned or now - source.created_at < ORPHAN_SOURCE_AGE:
+                continue
+            if source.running:
+                source.cleanup()
+                killed += 1
+
+        if players or killed:
+            logger.info(
+                f"Idle reaper freed {players} players, deleted {messages} messages, "
+                f"released {buffered // 1024} KiB of packet buffers and killed {killed} ffmpeg processes; "
+                f"{len(self.players)} players left"
+            )
+
+    def collect_state(self):
+        # Runs on the event loop and only serializes guilds whose state changed
+        upserts, positions = [], []
+        now = time.time()
+        live = set()
+        for guild_id, player in self.players.items():
+            if not player.connected:
+                continue
+            live.add(guild_id)
+            fingerprint = player.fingerprint()
+            if self.state_store.saved.get(guild_id) != fingerprint:
+                upserts.append(player.to_row())
+                self.state_store.saved[guild_id] = fingerprint
+            elif player.current:
+                positions.append((player.elapsed(), now, guild_id))
+        deletes = [guild_id for guild_id in self.state_store.saved if guild_id not in live]
+        for guild_id in deletes:
+            del self.state_store.saved[guild_id]
+        return upserts, positions, deletes
+
+    @tasks.loop(seconds=STATE_FLUSH_INTERVAL)
+    async def persist_state(self):
+        upserts, positions, deletes = self.collect_state()
+        if upserts or positions or deletes:
+            await asyncio.to_thread(self.state_store.write, upserts, positions, deletes)
+
+    async def restore_state(self):
+        try:
+            await self.bot.wait_until_ready()
+            try:
+                rows = await asyncio.to_thread(self.state_store.load)
+            except Exception as e:
+                logger.error(f"Failed to load guild state: {str(e)}")
+                return
+            stale = []
+            for row in rows:
+                guild = self.bot.get_guild(row['guild_id'])
+                if guild is None:
+                    if self.owns_shard_of(row['guild_id']):
+                        stale.append(row['guild_id'])  # the bot has left this guild
+                    continue  # otherwise handled by another shard cluster
+                try:
+                    if not await self.restore_player(guild, row):
+                        stale.append(row['guild_id'])
+                except Exception as e:
+                    logger.error(f"Failed to restore guild {guild.id}: {str(e)}")
+                    stale.append(row['guild_id'])
+            if stale:
+                await asyncio.to_thread(self.state_store.write, [], [], stale)
+        finally:
+            # Write-behind starts even if the restore failed, unless the cog is already unloading
+            if self.state_store.db is not None and not self.persist_state.is_running():
+                self.persist_state.start()
+
+    def owns_shard_of(self, guild_id):
+        # Discord's shard formula; without a launcher this process runs every shard
+        shard_count = self.bot.shard_count or 1
+        return (guild_id >> 22) % shard_count in getattr(self.bot, 'shards', {0: None})
+
+    async def restore_player(self, guild, row):
+        channel = guild.get_channel(row['voice_channel_id'])
+        if channel is None or not any(not m.bot for m in channel.members):
+            return False  # nobody left to play to
+        player = self.get_player(guild.id)
+        if player.connected:
+            return True  # someone started playing before the restore got here
+        player.loop_mode = row['loop_mode']
+        player.volume = row['volume']
+        if row['queue_limit']:
+            player.queue.max_length = row['queue_limit']
+        for state in json.loads(row['queue']):
+            player.queue.append(Track.from_state(state), force=True)
+        if row['current']:
+            player.queue.appendleft(Track.from_state(json.loads(row['current'])))
+            player.resume_position = row['position']
+        player.voice_client = await channel.connect()
+        text_channel = guild.get_channel(row['text_channel_id']) if row['text_channel_id'] else None
+        player.text_channel = text_channel
+        if player.queue:
+            self.start_if_idle(player, text_channel, False)
+        logger.info(f"Restored {len(player.queue)} tracks in guild {guild.id} at {row['position']:.0f}s")
+        return True
+
+    def write_cookies_file(self):
         cookies_base64 = os.getenv('YTDLP_COOKIES')
         if not cookies_base64:
             raise Exception('YTDLP_COOKIES environment variable is missing')
@@ -141,189 +923,628 @@ class MusicCog(commands.Cog):
             cookies_path = temp_file.name
         return cookies_path
 
-    async def get_audio_source(self, query):
-        cookies_path = None
+    def delete_cookies_file(self):
+        if self.cookies_path and os.path.exists(self.cookies_path):
+            try:
+                os.unlink(self.cookies_path)
+            except Exception as e:
+                logger.error(f"Failed to delete cookies file: {str(e)}")
+        self.cookies_path = None
+
+    def create_youtube_dl(self, **overrides):
+        ydl_opts = {
+            'format': 'bestaudio[acodec=opus]/bestaudio[acodec=webm]/bestaudio[ext=m4a]/bestaudio',
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': True,
+            'source_address': '0.0.0.0',
+            'default_search': 'ytsearch',
+            'cookiefile': self.cookies_path,
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+            'referer': 'https://www.youtube.com/',
+        }
+        ydl_opts.update(overrides)
+        return yt_dlp.YoutubeDL(ydl_opts)
+
+    def extract_playlist(self, query):
+        # Flat and unprocessed: entries stay a lazy generator that fetches one page at a time
+        ydl = self.create_youtube_dl(noplaylist=False, extract_flat='in_playlist', lazy_playlist=True)
         try:
-            cookies_path = await self.write_cookies_file()
-            ydl_opts = {
-                'format': 'bestaudio[acodec=opus]/bestaudio[acodec=webm]/bestaudio[ext=m4a]/bestaudio',
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,
-                'source_address': '0.0.0.0',
-                'default_search': 'ytsearch',
-                'cookies': cookies_path,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
-                'referer': 'https://www.youtube.com/',
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(query, download=False)
-                if 'entries' in info and info['entries']:
-                    entry = info['entries'][0]
-                else:
-                    entry = info
-                audio_url = None
-                for fmt in entry.get('formats', []):
-                    if fmt.get('acodec') in ['opus', 'webm', 'm4a'] and fmt.get('vcodec') == 'none':
-                        audio_url = fmt.get('url')
-                        break
-                if not audio_url:
-                    audio_url = entry.get('url')
-                    if not audio_url:
-                        raise Exception("No valid audio stream found")
-                title = entry.get('title', 'Unknown Title')
-                thumbnail = entry['thumbnails'][0]['url'] if 'thumbnails' in entry and entry['thumbnails'] else None
-                duration = entry.get('duration')
-                logger.info(f"Extracted stream URL: {audio_url} for title: {title}")
+            info = ydl.extract_info(query, download=False, process=False)
+            for _ in range(3):
+                # Watch URLs with a list= parameter redirect to the playlist/mix extractor
+                if info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False)
+            if info.get('_type') != 'playlist':
+                raise Exception("URL tersebut bukan playlist")
+        except Exception:
+            ydl.close()
+            raise
+        return ydl, info
+
+    def extract_track_info(self, query):
+        # Runs on a resolver worker thread, must not touch the event loop
+        with self.ydl_pool.checkout() as ydl:
+            info = ydl.extract_info(query, download=False)
+        if 'entries' in info and info['entries']:
+            entry = info['entries'][0]
+        else:
+            entry = info
+        audio_url = None
+        stream = entry
+        for fmt in entry.get('formats', []):
+            if fmt.get('acodec') in ['opus', 'webm', 'm4a'] and fmt.get('vcodec') == 'none':
+                audio_url = fmt.get('url')
+                stream = fmt
+                break
+        if not audio_url:
+            audio_url = entry.get('url')
+            if not audio_url:
+                raise Exception("No valid audio stream found")
+        return {
+            'id': entry.get('id'),
+            'title': entry.get('title', 'Unknown Title'),
+            'thumbnail': entry['thumbnails'][0]['url'] if 'thumbnails' in entry and entry['thumbnails'] else None,
+            'duration': entry.get('duration'),
+            'uploader': entry.get('uploader') or entry.get('channel'),
+            'url': audio_url,
+            'acodec': stream.get('acodec'),
+            'asr': stream.get('asr'),
+        }
+
+    async def resolve_query(self, query, playback=False):
+        try:
+            if not self.cookies_path:
+                raise Exception('YTDLP_COOKIES environment variable is missing')
+            run = self.resolver.run_playback if playback else self.resolver.run
+            info = await run(self.extract_track_info, query)
+            logger.info(f"Extracted stream URL: {info['url']} for title: {info['title']}")
+        except ResolverBusy:
+            raise
         except Exception as e:
             logger.error(f"Failed to process query '{query}': {str(e)}")
             raise Exception(f"Failed to process query: {str(e)}")
-        finally:
-            if cookies_path and os.path.exists(cookies_path):
-                try:
-                    os.unlink(cookies_path)
-                except Exception as e:
-                    logger.error(f"Failed to delete cookies file: {str(e)}")
+        return info
 
-        volume = self.volumes.get(self.guild_id, 1.0) if hasattr(self, 'guild_id') else 1.0
-        ffmpeg_options = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-            'options': f'-vn -ar 48000 -ac 2 -filter:a volume={volume}'
-        }
+    async def get_audio_source(self, query, playback=False):
+        started = time.perf_counter()
+        info = self.track_cache.get(query)
+        if info:
+            logger.info(f"Track cache hit for query '{query}': {info['title']}")
+        else:
+            info = self.track_cache.put(query, await self.resolve_query(query, playback))
+        track = Track.from_info(query, info)
+        self.search_index.add(TrackQueue.key_for(track), track.title, info.get('uploader'), track.source_query)
+        self.metrics.source_latency.observe(time.perf_counter() - started)
+        return track
+
+    async def create_source(self, player, track, offset=0.0):
+        location = self.audio_cache.lookup(track.video_id)
+        if location:
+            # Local Ogg/Opus copy: no stream URL to refresh and nothing to reconnect to
+            is_opus = True
+            before_options = ''
+        else:
+            if track.expired:
+                logger.info(f"Stream URL for {track.title} expired, resolving again")
+                # Playlist entries and restored tracks get here with no URL; a busy pool must not skip them
+                track = await self.get_audio_source(track.source_query, playback=True)
+            location = track.url
+            is_opus = track.is_opus
+            before_options = FFMPEG_BEFORE_OPTIONS
+        volume = player.volume
+        if offset:
+            before_options += f' -ss {offset:.2f}'
         try:
-            source = discord.FFmpegOpusAudio(
-                audio_url,
-                executable="ffmpeg",
-                **ffmpeg_options
-            )
-            return {'title': title, 'source': source, 'thumbnail': thumbnail, 'duration': duration, 'url': audio_url}
+            if is_opus and volume == 1.0:
+                # No DSP needed: remux the Opus packets instead of decoding them
+                source = TrackSource(discord.FFmpegOpusAudio(
+                    location,
+                    executable="ffmpeg",
+                    codec='copy',
+                    before_options=before_options,
+                    options='-vn'
+                ), offset=offset)
+            else:
+                source = TrackSource(discord.PCMVolumeTransformer(
+                    discord.FFmpegPCMAudio(
+                        location,
+                        executable="ffmpeg",
+                        before_options=before_options,
+                        options='-vn'
+                    ),
+                    volume=volume
+                ), offset=offset)
         except Exception as e:
-            logger.error(f"Failed to create FFmpegOpusAudio for URL {audio_url}: {str(e)}")
+            logger.error(f"Failed to create ffmpeg source for {location}: {str(e)}")
             raise Exception(f"Failed to create audio source: {str(e)}")
+        return track, source
 
-    async def update_volume(self, guild_id):
-        voice_client = self.voice_clients.get(guild_id)
-        current = self.currents.get(guild_id)
-        if voice_client and current and voice_client.is_playing():
-            volume = self.volumes.get(guild_id, 1.0)
-            ffmpeg_options = {
-                'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-                'options': f'-vn -ar 48000 -ac 2 -filter:a volume={volume}'
-            }
-            new_source = discord.FFmpegOpusAudio(
-                current['url'],
-                executable="ffmpeg",
-                **ffmpeg_options
+    async def prefetch_next(self, player, current):
+        try:
+            if not current.duration:
+                return  # live streams have no end to prepare for
+            remaining = current.duration - player.elapsed()
+            while remaining > PREFETCH_SECONDS:
+                # Re-check periodically since pauses and seeks move the end of the track
+                await asyncio.sleep(min(remaining - PREFETCH_SECONDS, 5))
+                remaining = current.duration - player.elapsed()
+            queued = player.upcoming_track()
+            while queued and player.recording(queued):
+                # Loop-single replays from memory; only prefetch if the recording gets dropped
+                await asyncio.sleep(1)
+                queued = player.upcoming_track()
+            if not queued or player.buffered(queued):
+                return
+            track, source = await self.create_source(player, queued)
+            try:
+                await asyncio.to_thread(source.prime)
+            except BaseException:
+                source.cleanup()
+                raise
+            player.prefetched = (queued, track, source)
+            logger.info(f"Prefetched next track {track.title} in guild {player.guild_id}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Prefetch failed in guild {player.guild_id}: {e}")
+
+    def schedule_prefetch(self, player):
+        player.cancel_prefetch()
+        if player.current and PREFETCH_SECONDS > 0:
+            player.prefetch_task = asyncio.create_task(self.prefetch_next(player, player.current))
+
+    def queue_changed(self, player):
+        # Whatever was warmed up may no longer be the next track
+        if player.current:
+            self.schedule_prefetch(player)
+        else:
+            player.cancel_prefetch()
+
+    async def take_source(self, player, queued):
+        prefetched, player.prefetched = player.prefetched, None
+        player.cancel_prefetch()
+        if prefetched:
+            prefetched_queued, track, source = prefetched
+            if prefetched_queued is queued and not (source.passthrough and player.volume != 1.0):
+                if not source.passthrough:
+                    source.volume = player.volume
+                return track, source
+            source.cleanup()
+        return await self.create_source(player, queued)
+
+    async def update_volume(self, player):
+        source = player.source
+        if not source:
+            return
+        if not source.passthrough:
+            source.volume = player.volume
+        elif player.volume != 1.0 and not player.volume_switching:
+            # Passthrough has no gain stage: switch once to a transcoding pipeline at the same position
+            player.volume_switching = True
+            try:
+                async with player.lock:
+                    await self.restart_source(player, source, source.position, catch_up=True)
+            finally:
+                player.volume_switching = False
+        logger.info(f"Updated volume to {player.volume*100:.0f}% in guild {player.guild_id}")
+
+    async def restart_source(self, player, source, offset, catch_up=False):
+        # Caller holds player.lock
+        if not player.current or player.source is not source:
+            return False
+        frames_at_start = source.frames
+        track, new_source = await self.create_source(player, player.current, offset=offset)
+        try:
+            await asyncio.to_thread(new_source.prime)
+            if catch_up:
+                await asyncio.to_thread(new_source.skip_frames, source.frames - frames_at_start)
+        except BaseException:
+            new_source.cleanup()
+            raise
+        if player.source is not source:
+            new_source.cleanup()  # track changed while the new pipeline was starting
+            return False
+        if not new_source.passthrough:
+            new_source.volume = player.volume
+        player.swap_source(new_source)
+        source.cleanup()
+        player.current = track
+        return True
+
+    def replay_from_buffer(self, player, frame):
+        # Caller holds player.lock. Serves rewinds and replays from recorded packets when the
+        # buffer is contiguous with the pipeline that is playing, so it can continue seamlessly
+        buffer = player.buffer
+        source = player.source
+        if not buffer or not buffer.usable or not source or player.volume != 1.0 or not 0 <= frame < len(buffer):
+            return False
+        continuation = None
+        if not buffer.complete:
+            if source is buffer.recorder:
+                continuation = source
+            elif isinstance(source.original, BufferedOpus) and source.original.continuation is buffer.recorder:
+                continuation, source.original.continuation = source.original.continuation, None
+            else:
+                return False
+        player.swap_source(TrackSource(BufferedOpus(buffer, frame, continuation), offset=frame * FRAME_LENGTH))
+        if source is not continuation:
+            source.cleanup()
+        return True
+
+    async def seek_to(self, player, position):
+        async with player.lock:
+            current = player.current
+            if not current or not player.source:
+                raise Exception("Tidak ada yang sedang diputar.")
+            position = max(0.0, position)
+            if current.duration:
+                position = min(position, max(0.0, current.duration - 1))
+            if self.replay_from_buffer(player, int(position / FRAME_LENGTH)):
+                self.schedule_prefetch(player)
+                logger.info(f"Seeked to {position:.1f}s from memory in guild {player.guild_id}")
+                return position
+            # Input-side -ss only fetches bytes from the target offset onwards
+            if await self.restart_source(player, player.source, position):
+                self.schedule_prefetch(player)
+                logger.info(f"Seeked to {position:.1f}s in guild {player.guild_id}")
+        return position
+
+    def build_now_playing_embed(self, player, track, color):
+        embed = discord.Embed(
+            title="Now Playing",
+            description=f"🎵 {track.title}\n**Queue Position:** 1",
+            color=color
+        )
+        if track.thumbnail:
+            embed.set_thumbnail(url=track.thumbnail)
+        if track.duration:
+            embed.add_field(name="Duration", value=format_timestamp(track.duration), inline=True)
+            elapsed = player.elapsed()
+            embed.add_field(
+                name="Progress",
+                value=f"{progress_bar(elapsed, track.duration)} {format_timestamp(elapsed)}",
+                inline=False
             )
-            voice_client.stop()
-            current['source'] = new_source
-            voice_client.play(new_source, after=lambda e: asyncio.run_coroutine_threadsafe(
-                self.play_next(guild_id, self.play_messages[guild_id].channel), self.bot.loop
-            ).result())
-            logger.info(f"Updated volume to {volume*100:.0f}% in guild {guild_id}")
-
-    async def animate_embed(self, guild_id, channel, message):
-        colors = [
-            discord.Color.red(),
-            discord.Color.orange(),
-            discord.Color.yellow(),
-            discord.Color.green(),
-            discord.Color.blue(),
-            discord.Color.purple(),
-        ]
+        embed.set_footer(text="Use the buttons below to control playback")
+        return embed
+
+    async def animate_embed(self, player, message):
+        # Colour cycling and the progress bar are cosmetic: the scheduler may coalesce or drop them
         i = 0
-        while guild_id in self.currents and self.currents[guild_id]:
+        while player.current:
             try:
-                embed = message.embeds[0].copy()
-                embed.color = colors[i % len(colors)]
-                await message.edit(embed=embed)
+                interval = ANIMATION_INTERVAL * (3 if self.ui_scheduler.under_pressure else 1)
+                await asyncio.sleep(interval)
+                track = player.current
+                if not track or player.message is not message:
+                    break
+                if player.voice_client and player.voice_client.is_paused():
+                    continue
+                embed = self.build_now_playing_embed(player, track, ANIMATION_COLORS[i % len(ANIMATION_COLORS)])
+                self.ui_scheduler.submit(message, cosmetic=True, embed=embed)
                 i += 1
-                await asyncio.sleep(0.5)
             except Exception as e:
-                logger.error(f"Animation error in guild {guild_id}: {e}")
+                logger.error(f"Animation error in guild {player.guild_id}: {e}")
                 break
-        if guild_id in self.animation_tasks:
-            del self.animation_tasks[guild_id]
+        if player.animation_task is asyncio.current_task():
+            player.animation_task = None
 
-    async def play_next(self, guild_id, text_channel):
-        try:
-            loop_mode = self.loop_modes.get(guild_id, 0)
-            current = self.currents.get(guild_id)
-
-            if loop_mode == 1 and current:
-                self.queues[guild_id].insert(0, current)
-            elif loop_mode == 2 and current:
-                self.queues[guild_id].append(current)
-
-            if self.queues.get(guild_id):
-                self.currents[guild_id] = self.queues[guild_id].pop(0)
-                voice_client = self.voice_clients.get(guild_id)
-                if voice_client:
-                    logger.info(f"Playing: {self.currents[guild_id]['title']} with volume {self.volumes.get(guild_id, 1.0)*100:.0f}%")
-
-                    embed = discord.Embed(
-                        title="Now Playing",
-                        description=f"🎵 {self.currents[guild_id]['title']}\n**Queue Position:** 1",
-                        color=discord.Color.from_rgb(
-                            random.randint(0, 255),
-                            random.randint(0, 255),
-                            random.randint(0, 255)
-                        )
-                    )
-                    if 'thumbnail' in self.currents[guild_id] and self.currents[guild_id]['thumbnail']:
-                        embed.set_thumbnail(url=self.currents[guild_id]['thumbnail'])
-                    if 'duration' in self.currents[guild_id] and self.currents[guild_id]['duration']:
-                        dur = self.currents[guild_id]['duration']
-                        mins, secs = divmod(int(dur), 60)
-                        embed.add_field(name="Duration", value=f"{mins}:{secs:02d}", inline=True)
-                    embed.set_footer(text="Use the buttons below to control playback")
-                    
-                    view = AnimatedMusicControls(self, guild_id)
-                    if guild_id in self.play_messages:
-                        try:
-                            await self.play_messages[guild_id].delete()
-                        except:
-                            pass
-                    self.play_messages[guild_id] = await text_channel.send(embed=embed, view=view)
-
-                    if guild_id in self.animation_tasks and not self.animation_tasks[guild_id].done():
-                        self.animation_tasks[guild_id].cancel()
-                    self.animation_tasks[guild_id] = asyncio.create_task(self.animate_embed(guild_id, text_channel, self.play_messages[guild_id]))
+    async def show_now_playing(self, player, text_channel, track):
+        embed = self.build_now_playing_embed(
+            player,
+            track,
+            discord.Color.from_rgb(
+                random.randint(0, 255),
+                random.randint(0, 255),
+                random.randint(0, 255)
+            )
+        )
+        message = player.message
+        if message and message.channel.id == text_channel.id:
+            # Edit the existing panel in place; its control buttons stay attached
+            self.ui_scheduler.submit(message, embed=embed)
+        else:
+            await player.delete_message()
+            view = player.view = AnimatedMusicControls(self, player.guild_id)
+            message = player.message = await text_channel.send(embed=embed, view=view)
 
-                    def after_play(error):
-                        if error:
-                            logger.error(f"Playback error in guild {guild_id}: {str(error)}")
-                            asyncio.run_coroutine_threadsafe(
-                                text_channel.send(f"Playback error: {str(error)}"), self.bot.loop
-                            ).result()
-                        asyncio.run_coroutine_threadsafe(
-                            self.play_next(guild_id, text_channel), self.bot.loop
-                        ).result()
-                    voice_client.play(self.currents[guild_id]['source'], after=after_play)
-                else:
+        player.cancel_animation()
+        player.animation_task = asyncio.create_task(self.animate_embed(player, message))
+
+    def ensure_player_loop(self, player):
+        if player.loop_task is None or player.loop_task.done():
+            player.loop_task = asyncio.create_task(self.player_loop(player))
+
+    async def player_loop(self, player):
+        # The only place tracks change; the audio thread just sets player.finished
+        while True:
+            try:
+                # Cleared before play_next, so tracks queued while it finishes up still wake the loop
+                player.wakeup.clear()
+                result = await self.play_next(player)
+                if result == 'played':
+                    await player.finished.wait()
+                    error, player.playback_error = player.playback_error, None
+                    if error:
+                        self.metrics.playback_errors.inc()
+                        logger.error(f"Playback error in guild {player.guild_id}: {str(error)}")
+                        if player.text_channel:
+                            await player.text_channel.send(f"Playback error: {str(error)}")
+                    elif player.current and player.buffered(player.current):
+                        # The recording doubles as the cached copy, no second download needed
+                        self.audio_cache.store(player.current, player.buffer.packets)
+                    continue
+                if result == 'disconnected':
+                    # The queue stays put until start_if_idle wakes the loop after a reconnect
+                    player.wakeup.clear()
+                    await player.wakeup.wait()
+                elif not player.queue:
+                    await player.wakeup.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Player loop error in guild {player.guild_id}: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def play_next(self, player):
+        # Moves to the next track according to the loop mode.
+        # Returns 'played', or why nothing is playing: 'ended', 'disconnected' or 'interrupted'
+        guild_id = player.guild_id
+        text_channel = player.text_channel
+        async with player.lock:
+            current = player.current
+            if player.loop_mode == 1 and current:
+                player.queue.appendleft(current)
+            elif player.loop_mode == 2 and current:
+                player.queue.append(current, force=True)
+            player.current = None
+
+            while player.queue:
+                voice_client = player.voice_client
+                if not voice_client or not voice_client.is_connected():
                     logger.error(f"No voice client found for guild {guild_id}")
-                    await text_channel.send("Error: No voice client available.")
-                    self.currents.pop(guild_id, None)
+                    self.metrics.transitions.inc('disconnected')
+                    return 'disconnected'
+                started = time.perf_counter()
+                queued = player.current = player.queue.popleft()
+                try:
+                    if player.buffered(queued):
+                        result = 'buffered'
+                        # Loop-single: serve the previous run from memory, no network or ffmpeg
+                        player.cancel_prefetch()
+                        track, source = queued, TrackSource(BufferedOpus(player.buffer, 0))
+                    elif player.resume_position:
+                        # First track after a restart continues where it was
+                        result = 'resumed'
+                        offset, player.resume_position = player.resume_position, 0.0
+                        player.release_buffer()
+                        track, source = await self.create_source(player, queued, offset=offset)
+                    else:
+                        result = 'played'
+                        player.release_buffer()
+                        track, source = await self.take_source(player, queued)
+                    if player.current is not queued:
+                        source.cleanup()  # stopped while the track was being prepared
+                        self.metrics.transitions.inc('interrupted')
+                        return 'interrupted'
+                    if result == 'played' and source.passthrough and not source.offset:
+                        player.buffer = PacketBuffer(TrackQueue.key_for(track), self.packet_budget, track.duration)
+                        source.start_recording(player.buffer)
+                    player.current = track
+                    logger.info(f"Playing: {track.title} with volume {player.volume*100:.0f}%")
+
+                    def after_play(error):
+                        # Runs on the audio thread: hand over to player_loop and return immediately
+                        player.playback_error = error
+                        self.bot.loop.call_soon_threadsafe(player.finished.set)
+                    def first_frame(started=started):
+                        elapsed = time.perf_counter() - started
+                        self.bot.loop.call_soon_threadsafe(self.metrics.first_audio.observe, elapsed)
+                    player.finished.clear()
+                    source.on_first_frame = first_frame
+                    # Start audio before any REST calls so the handoff stays gapless
+                    voice_client.play(source, after=after_play)
+                    self.metrics.transitions.inc(result)
+                except Exception as e:
+                    self.metrics.play_errors.inc()
+                    logger.error(f"Error in play_next for guild {guild_id}: {str(e)}")
+                    player.current = None
+                    if text_channel:
+                        await text_channel.send(f"Error playing next song: {str(e)}")
+                    continue
+                self.schedule_prefetch(player)
+                self.search_index.played(TrackQueue.key_for(track), guild_id)
+                self.audio_cache.schedule(track)
+                break
             else:
-                self.currents.pop(guild_id, None)
-                embed = discord.Embed(
-                    title="Queue Ended",
-                    description="No more tracks in queue",
-                    color=discord.Color.red()
-                )
-                if guild_id in self.play_messages:
+                if current:
+                    self.metrics.transitions.inc('ended')
+                player.cancel_prefetch()
+                if current and text_channel:
+                    await self.show_queue_ended(player, text_channel)
+                return 'ended'
+
+        if text_channel:
+            try:
+                await self.show_now_playing(player, text_channel, track)
+            except Exception as e:
+                logger.error(f"Failed to show now playing in guild {guild_id}: {str(e)}")
+        return 'played'
+
+    async def show_queue_ended(self, player, text_channel):
+        embed = discord.Embed(
+            title="Queue Ended",
+            description="No more tracks in queue",
+            color=discord.Color.red()
+        )
+        message, player.message = player.message, None
+        player.stop_view()
+        if message and message.channel.id == text_channel.id:
+            self.ui_scheduler.submit(message, embed=embed, view=None)
+        else:
+            if message:
+                try:
+                    await message.delete()
+                except:
+                    pass
+            await text_channel.send(embed=embed)
+
+    def start_if_idle(self, player, text_channel, next_changed):
+        if not player.connected:
+            return
+        player.text_channel = text_channel
+        player.last_active = time.monotonic()
+        self.ensure_player_loop(player)
+        if player.current is None:
+            player.wakeup.set()
+        elif next_changed:
+            self.queue_changed(player)
+
+    async def connect_member(self, member):
+        # join() for callers without a prefix-command context
+        if not member.voice or not member.voice.channel:
+            raise Exception("Kamu harus berada di voice channel untuk memutar musik.")
+        player = self.get_player(member.guild.id)
+        if not player.connected:
+            player.voice_client = await member.voice.channel.connect()
+            logger.info(f"Joined voice channel: {member.voice.channel.name} in guild {member.guild.id}")
+        return player
+
+    async def enqueue_batch(self, player, queries, text_channel):
+        # Lookups run concurrently, but tracks are queued strictly in the order they were given,
+        # each one as soon as it and everything before it has resolved
+        semaphore = asyncio.Semaphore(max(1, min(BATCH_CONCURRENCY, self.resolver.workers)))
+
+        async def resolve(query):
+            async with semaphore:
+                try:
+                    return await self.get_audio_source(query)
+                except Exception as e:
+                    return e
+
+        lookups = [asyncio.create_task(resolve(query)) for query in queries]
+        report = []  # (query, Track or Exception)
+        full = None
+        try:
+            for query, task in zip(queries, lookups):
+                if full:
+                    task.cancel()
+                    report.append((query, full))
+                    continue
+                result = await task
+                if not isinstance(result, Exception):
+                    next_changed = not player.queue
                     try:
-                        await self.play_messages[guild_id].delete()
-                    except:
-                        pass
-                await text_channel.send(embed=embed)
+                        player.queue.append(result)
+                    except QueueFull as e:
+                        result = full = e
+                    except DuplicateTrack as e:
+                        result = e
+                    else:
+                        self.start_if_idle(player, text_channel, next_changed)
+                report.append((query, result))
+        finally:
+            for task in lookups:
+                task.cancel()
+        logger.info(f"Batch enqueue in guild {player.guild_id}: "
+                    f"{sum(1 for _, r in report if isinstance(r, Track))}/{len(queries)} tracks queued")
+        return report
+
+    def build_added_embed(self, song, queue_position):
+        embed = discord.Embed(
+            title="Added to Queue",
+            description=f"🎵 {song.title}\n**Queue Position:** {queue_position}",
+            color=discord.Color.blue()
+        )
+        if song.thumbnail:
+            embed.set_thumbnail(url=song.thumbnail)
+        return embed
+
+    def build_batch_embed(self, report):
+        lines = []
+        for query, result in report:
+            if isinstance(result, Track):
+                line = f"✅ {result.title}"
+            else:
+                line = f"❌ {query} — {str(result)}"
+            lines.append(line if len(line) <= 120 else line[:117] + "...")
+        queued = sum(1 for _, result in report if isinstance(result, Track))
+        embed = discord.Embed(
+            title="Added to Queue",
+            description="\n".join(lines),
+            color=discord.Color.blue() if queued else discord.Color.red()
+        )
+        embed.set_footer(text=f"{queued}/{len(report)} tracks queued")
+        return embed
+
+    def build_playlist_embed(self, title, added, status=None):
+        embed = discord.Embed(
+            title="Loading Playlist" if status is None else "Playlist Loaded",
+            description=f"📃 {title}\n**Tracks Added:** {added}",
+            color=discord.Color.blue() if status is None else discord.Color.green()
+        )
+        if status:
+            embed.set_footer(text=status)
+        return embed
+
+    async def load_playlist(self, player, query, text_channel):
+        ydl = None
+        message = None
+        view = None
+        title = "Playlist"
+        added = 0
+        status = "Done"
+        try:
+            ydl, info = await self.resolver.run(self.extract_playlist, query)
+            title = info.get('title') or title
+            entries = iter(info.get('entries') or [])
+            view = PlaylistView(self, player.guild_id)
+            message = await text_channel.send(embed=self.build_playlist_embed(title, added), view=view)
+            logger.info(f"Loading playlist {title} in guild {player.guild_id}")
+            full = False
+            while not full:
+                # The first page uses the normal lane so playback starts right away; the rest
+                # only runs on idle workers and never holds more than half the resolver pool
+                run = self.resolver.run_background if added else self.resolver.run
+                chunk = await run(take_entries, entries, PLAYLIST_CHUNK_SIZE)
+                if not chunk:
+                    break
+                next_changed = not player.queue
+                for entry in chunk:
+                    track = Track.from_flat_entry(entry)
+                    if track is None:
+                        continue
+                    try:
+                        player.queue.append(track)
+                        added += 1
+                    except DuplicateTrack:
+                        continue
+                    except QueueFull as e:
+                        status = str(e)
+                        full = True
+                        break
+                self.start_if_idle(player, text_channel, next_changed)
+                self.ui_scheduler.submit(message, cosmetic=True, embed=self.build_playlist_embed(title, added))
+        except asyncio.CancelledError:
+            status = "Cancelled"
+            raise
         except Exception as e:
-            logger.error(f"Error in play_next for guild {guild_id}: {str(e)}")
-            self.currents.pop(guild_id, None)
-            await text_channel.send(f"Error playing next song: {str(e)}")
-            if self.queues.get(guild_id):
-                logger.info(f"Attempting to play next song in queue for guild {guild_id}")
-                await self.play_next(guild_id, text_channel)
+            status = f"Stopped: {str(e)}"
+            logger.error(f"Error loading playlist '{query}' in guild {player.guild_id}: {str(e)}")
+            if message is None:
+                await text_channel.send(f"Error: {str(e)}")
+        finally:
+            if ydl:
+                ydl.close()
+            if view:
+                view.stop()  # removing it from the message doesn't drop it from the view store
+            if message:
+                self.ui_scheduler.submit(message, embed=self.build_playlist_embed(title, added, status), view=None)
+            if player.playlist_task is asyncio.current_task():
+                player.playlist_task = None
+            logger.info(f"Playlist {title} in guild {player.guild_id}: {added} tracks added ({status})")
 
     @commands.command()
     async def join(self, ctx):
@@ -333,15 +1554,16 @@ class MusicCog(commands.Cog):
             return
 
         channel = ctx.author.voice.channel
+        player = self.get_player(guild_id)
         try:
-            if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-                if self.voice_clients[guild_id].channel != channel:
-                    await self.voice_clients[guild_id].move_to(channel)
+            if player.connected:
+                if player.voice_client.channel != channel:
+                    await player.voice_client.move_to(channel)
             else:
-                self.voice_clients[guild_id] = await channel.connect()
-            self.queues.setdefault(guild_id, [])
-            self.loop_modes.setdefault(guild_id, 0)
-            self.volumes.setdefault(guild_id, 1.0)
+                player.voice_client = await channel.connect()
+                if player.queue and player.current is None:
+                    # Tracks left over from a disconnect continue where the queue stopped
+                    self.start_if_idle(player, ctx.channel, False)
             await ctx.send(f"Berhasil join ke voice channel: {channel.name}")
             logger.info(f"Joined voice channel: {channel.name} in guild {guild_id}")
         except discord.errors.ClientException as e:
@@ -354,67 +1576,128 @@ class MusicCog(commands.Cog):
     @commands.command()
     async def leave(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id in self.play_messages:
-            try:
-                await self.play_messages[guild_id].delete()
-            except:
-                pass
-            self.play_messages.pop(guild_id, None)
-        
-        if guild_id in self.animation_tasks:
-            self.animation_tasks[guild_id].cancel()
-            self.animation_tasks.pop(guild_id, None)
-        
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-            await self.voice_clients[guild_id].disconnect()
-            self.voice_clients.pop(guild_id, None)
-            self.queues.pop(guild_id, None)
-            self.currents.pop(guild_id, None)
-            self.loop_modes.pop(guild_id, None)
-            self.volumes.pop(guild_id, None)
+        if self.connected_player(guild_id):
+            await self.destroy_player(guild_id)
             await ctx.send("Keluar dari voice channel.")
             logger.info(f"Left voice channel in guild {guild_id}")
         else:
+            player = self.players.get(guild_id)
+            if player:
+                await player.delete_message()
+                player.cancel_animation()
             await ctx.send("Bot tidak berada di voice channel.")
 
     @commands.command()
     async def play(self, ctx, *, query):
         guild_id = ctx.guild.id
-        self.guild_id = guild_id  # Temporary store guild_id for get_audio_source
 
-        if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
+        if not self.connected_player(guild_id):
             if not ctx.author.voice or not ctx.author.voice.channel:
                 await ctx.send("Kamu harus berada di voice channel untuk memutar musik.")
                 return
             await self.join(ctx)
-            if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
+            if not self.connected_player(guild_id):
                 await ctx.send("Gagal join ke voice channel.")
                 return
 
+        player = self.players[guild_id]
+        if is_playlist_query(query):
+            if player.playlist_task and not player.playlist_task.done():
+                await ctx.send("Playlist lain sedang dimuat, tunggu atau batalkan dulu.")
+                return
+            player.playlist_task = asyncio.create_task(self.load_playlist(player, query, ctx.channel))
+            return
+
         try:
+            player.queue.check_space()
             song = await self.get_audio_source(query)
-            self.queues.setdefault(guild_id, []).append(song)
-            queue_position = len(self.queues[guild_id])
-            embed = discord.Embed(
-                title="Added to Queue",
-                description=f"🎵 {song['title']}\n**Queue Position:** {queue_position}",
-                color=discord.Color.blue()
-            )
-            if 'thumbnail' in song and song['thumbnail']:
-                embed.set_thumbnail(url=song['thumbnail'])
-            await ctx.send(embed=embed)
-            logger.info(f"Added to queue: {song['title']} at position {queue_position} in guild {guild_id}")
-            if not self.voice_clients[guild_id].is_playing() and not self.voice_clients[guild_id].is_paused():
-                await self.play_next(guild_id, ctx.channel)
+            player.queue.append(song)
+            queue_position = len(player.queue)
+            await ctx.send(embed=self.build_added_embed(song, queue_position))
+            logger.info(f"Added to queue: {song.title} at position {queue_position} in guild {guild_id}")
+            self.start_if_idle(player, ctx.channel, queue_position == 1)
         except Exception as e:
             await ctx.send(f"Error: {str(e)}")
             logger.error(f"Error in play command for query '{query}': {str(e)}")
 
+    @app_commands.command(name="play", description="Play a song or playlist by name or URL")
+    @app_commands.describe(query="Song name or URL")
+    async def play_slash(self, interaction: discord.Interaction, query: str):
+        # Resolving takes longer than the 3 s interaction window
+        await interaction.response.defer(thinking=True)
+        try:
+            player = await self.connect_member(interaction.user)
+            if is_playlist_query(query):
+                if player.playlist_task and not player.playlist_task.done():
+                    await interaction.followup.send("Playlist lain sedang dimuat, tunggu atau batalkan dulu.")
+                    return
+                player.playlist_task = asyncio.create_task(self.load_playlist(player, query, interaction.channel))
+                await interaction.followup.send("Memuat playlist...")
+                return
+            player.queue.check_space()
+            song = await self.get_audio_source(query)
+            player.queue.append(song)
+            queue_position = len(player.queue)
+            await interaction.followup.send(embed=self.build_added_embed(song, queue_position))
+            logger.info(f"Added to queue: {song.title} at position {queue_position} in guild {interaction.guild_id}")
+            self.start_if_idle(player, interaction.channel, queue_position == 1)
+        except Exception as e:
+            await interaction.followup.send(f"Error: {str(e)}")
+            logger.error(f"Error in /play for query '{query}': {str(e)}")
+
+    @play_slash.autocomplete('query')
+    async def play_query_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Served from the local index only; a yt-dlp search cannot answer inside Discord's 3 s window
+        choices = []
+        for entry in self.search_index.search(current, interaction.guild_id):
+            if len(entry.query) > 100:
+                continue  # choice values are limited to 100 characters
+            name = f"{entry.title} — {entry.artist}" if entry.artist else entry.title
+            choices.append(app_commands.Choice(name=name[:100], value=entry.query))
+        return choices
+
+    @commands.command()
+    async def playmany(self, ctx, *, queries):
+        guild_id = ctx.guild.id
+        queries = parse_batch_queries(queries)
+        if not queries:
+            await ctx.send("Berikan minimal satu lagu, pisahkan dengan baris baru atau |.")
+            return
+        if not self.connected_player(guild_id):
+            if not ctx.author.voice or not ctx.author.voice.channel:
+                await ctx.send("Kamu harus berada di voice channel untuk memutar musik.")
+                return
+            await self.join(ctx)
+            if not self.connected_player(guild_id):
+                await ctx.send("Gagal join ke voice channel.")
+                return
+        async with ctx.typing():
+            report = await self.enqueue_batch(self.players[guild_id], queries, ctx.channel)
+        await ctx.send(embed=self.build_batch_embed(report))
+
+    @app_commands.command(name="playmany", description="Queue several songs at once, separated by |")
+    @app_commands.describe(queries="Song names or URLs separated by |")
+    async def playmany_slash(self, interaction: discord.Interaction, queries: str):
+        queries = parse_batch_queries(queries)
+        if not queries:
+            await interaction.response.send_message("Berikan minimal satu lagu, pisahkan dengan |.", ephemeral=True)
+            return
+        # Resolving takes longer than the 3 s interaction window
+        await interaction.response.defer(thinking=True)
+        try:
+            player = await self.connect_member(interaction.user)
+            report = await self.enqueue_batch(player, queries, interaction.channel)
+            await interaction.followup.send(embed=self.build_batch_embed(report))
+        except Exception as e:
+            await interaction.followup.send(f"Error: {str(e)}")
+            logger.error(f"Error in /playmany in guild {interaction.guild_id}: {str(e)}")
+
     @commands.command()
     async def pause(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_playing():
-            self.voice_clients[guild_id].pause()
+        player = self.connected_player(guild_id)
+        if player and player.voice_client.is_playing():
+            player.voice_client.pause()
             await ctx.send("Dipause.")
             logger.info(f"Paused playback in guild {guild_id}")
         else:
@@ -423,8 +1706,9 @@ class MusicCog(commands.Cog):
     @commands.command()
     async def resume(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_paused():
-            self.voice_clients[guild_id].resume()
+        player = self.connected_player(guild_id)
+        if player and player.voice_client.is_paused():
+            player.voice_client.resume()
             await ctx.send("Dilanjutkan.")
             logger.info(f"Resumed playback in guild {guild_id}")
         else:
@@ -433,39 +1717,27 @@ class MusicCog(commands.Cog):
     @commands.command()
     async def stop(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id in self.play_messages:
-            try:
-                await self.play_messages[guild_id].delete()
-            except:
-                pass
-            self.play_messages.pop(guild_id, None)
         await self.stop_music(guild_id)
         await ctx.send("Dihentikan.")
         logger.info(f"Stopped playback in guild {guild_id}")
 
     async def stop_music(self, guild_id):
-        if guild_id in self.play_messages:
-            try:
-                await self.play_messages[guild_id].delete()
-            except:
-                pass
-            self.play_messages.pop(guild_id, None)
-            
-        if guild_id in self.animation_tasks:
-            self.animation_tasks[guild_id].cancel()
-            self.animation_tasks.pop(guild_id, None)
-            
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-            self.voice_clients[guild_id].stop()
-            self.queues[guild_id] = []
-            self.currents.pop(guild_id, None)
+        player = self.players.get(guild_id)
+        if player is None:
+            return
+        if player.connected:
+            await player.reset()
             logger.info(f"Cleared queue and stopped music in guild {guild_id}")
+        else:
+            await player.delete_message()
+            player.cancel_animation()
 
     @commands.command()
     async def skip(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-            self.voice_clients[guild_id].stop()
+        player = self.connected_player(guild_id)
+        if player:
+            player.voice_client.stop()
             await ctx.send("Dilewati.")
             logger.info(f"Skipped song in guild {guild_id}")
         else:
@@ -474,9 +1746,10 @@ class MusicCog(commands.Cog):
     @commands.command()
     async def volume(self, ctx, vol: int):
         guild_id = ctx.guild.id
-        if guild_id in self.voice_clients and self.voice_clients[guild_id].is_connected():
-            self.volumes[guild_id] = max(0.0, min(2.0, vol / 100))
-            await self.update_volume(guild_id)
+        player = self.connected_player(guild_id)
+        if player:
+            player.volume = max(0.0, min(2.0, vol / 100))
+            await self.update_volume(player)
             await ctx.send(f"Volume diatur ke {vol}%")
             logger.info(f"Set volume to {vol}% in guild {guild_id}")
         else:
@@ -485,37 +1758,139 @@ class MusicCog(commands.Cog):
     @commands.command()
     async def loop(self, ctx, mode: str):
         guild_id = ctx.guild.id
+        player = self.get_player(guild_id)
         if mode.lower() == 'off':
-            self.loop_modes[guild_id] = 0
+            player.loop_mode = 0
             await ctx.send("Mode loop: Mati")
         elif mode.lower() == 'single':
-            self.loop_modes[guild_id] = 1
+            player.loop_mode = 1
             await ctx.send("Mode loop: Single")
         elif mode.lower() == 'queue':
-            self.loop_modes[guild_id] = 2
+            player.loop_mode = 2
             await ctx.send("Mode loop: Antrian")
         else:
             await ctx.send("Mode tidak valid. Gunakan off, single, atau queue.")
+        self.queue_changed(player)
         logger.info(f"Set loop mode to {mode} in guild {guild_id}")
 
+    @commands.command()
+    async def seek(self, ctx, position: str):
+        guild_id = ctx.guild.id
+        try:
+            target = parse_timestamp(position)
+        except ValueError:
+            await ctx.send("Format waktu tidak valid. Gunakan mm:ss, contoh: !seek 1:30")
+            return
+        try:
+            target = await self.seek_to(self.get_player(guild_id), target)
+            await ctx.send(f"Dilompati ke {format_timestamp(target)}")
+        except Exception as e:
+            await ctx.send(f"Error: {str(e)}")
+            logger.error(f"Error seeking in guild {guild_id}: {str(e)}")
+
+    @commands.command()
+    async def replay(self, ctx):
+        guild_id = ctx.guild.id
+        try:
+            await self.seek_to(self.get_player(guild_id), 0)
+            await ctx.send("Diputar ulang dari awal.")
+            logger.info(f"Replayed current track in guild {guild_id}")
+        except Exception as e:
+            await ctx.send(f"Error: {str(e)}")
+            logger.error(f"Error replaying in guild {guild_id}: {str(e)}")
+
     @commands.command(name='queue')
     async def show_queue(self, ctx):
-        guild_id = ctx.guild.id
-        if guild_id in self.queues and self.queues[guild_id]:
-            queue_list = "\n".join([f"{i+1}. {song['title']}" for i, song in enumerate(self.queues[guild_id])])
-            embed = discord.Embed(
-                title="Current Queue",
-                description=queue_list,
-                color=discord.Color.blue()
-            )
-            await ctx.send(embed=embed)
+        player = self.players.get(ctx.guild.id)
+        if player and player.queue:
+            view = QueueView(self, ctx.guild.id, ctx.author.id)
+            view.message = await ctx.send(embed=view.build_embed(), view=view)
+        else:
+            await ctx.send("Antrian kosong.")
+
+    @app_commands.command(name="queue", description="Show the queue, only visible to you")
+    async def queue_slash(self, interaction: discord.Interaction):
+        player = self.players.get(interaction.guild_id)
+        if player and player.queue:
+            await QueueView(self, interaction.guild_id, interaction.user.id).send_ephemeral(interaction)
         else:
+            await interaction.response.send_message("Antrian kosong.", ephemeral=True)
+
+    @commands.command()
+    async def remove(self, ctx, position: int):
+        guild_id = ctx.guild.id
+        player = self.players.get(guild_id)
+        if not player or not player.queue:
+            await ctx.send("Antrian kosong.")
+            return
+        try:
+            song = player.queue.remove(position - 1)
+        except IndexError as e:
+            await ctx.send(str(e))
+            return
+        if position == 1:
+            self.queue_changed(player)
+        await ctx.send(f"Dihapus dari antrian: {song.title}")
+        logger.info(f"Removed {song.title} from position {position} in guild {guild_id}")
+
+    @commands.command()
+    async def move(self, ctx, source: int, destination: int):
+        guild_id = ctx.guild.id
+        player = self.players.get(guild_id)
+        if not player or not player.queue:
             await ctx.send("Antrian kosong.")
+            return
+        try:
+            song = player.queue.move(source - 1, destination - 1)
+        except IndexError as e:
+            await ctx.send(str(e))
+            return
+        if 1 in (source, destination):
+            self.queue_changed(player)
+        await ctx.send(f"Dipindahkan: {song.title} ke posisi {destination}")
+        logger.info(f"Moved {song.title} from {source} to {destination} in guild {guild_id}")
+
+    @commands.command()
+    async def shuffle(self, ctx):
+        guild_id = ctx.guild.id
+        player = self.players.get(guild_id)
+        if not player or len(player.queue) < 2:
+            await ctx.send("Antrian terlalu pendek untuk diacak.")
+            return
+        player.queue.shuffle()
+        self.queue_changed(player)
+        await ctx.send(f"Antrian diacak ({len(player.queue)} lagu).")
+        logger.info(f"Shuffled {len(player.queue)} tracks in guild {guild_id}")
+
+    @commands.command()
+    async def clear(self, ctx):
+        guild_id = ctx.guild.id
+        player = self.players.get(guild_id)
+        if not player or not player.queue:
+            await ctx.send("Antrian kosong.")
+            return
+        count = len(player.queue)
+        player.queue.clear()
+        self.queue_changed(player)
+        await ctx.send(f"Antrian dikosongkan ({count} lagu dihapus).")
+        logger.info(f"Cleared {count} queued tracks in guild {guild_id}")
+
+    @commands.command()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def queuelimit(self, ctx, limit: int):
+        guild_id = ctx.guild.id
+        if not 1 <= limit <= QUEUE_MAX_LENGTH:
+            await ctx.send(f"Batas antrian harus antara 1 dan {QUEUE_MAX_LENGTH}.")
+            return
+        player = self.get_player(guild_id)
+        player.queue.max_length = limit
+        await ctx.send(f"Batas antrian diatur ke {limit} lagu.")
+        logger.info(f"Set queue limit to {limit} in guild {guild_id}")
 
     @commands.command()
     async def controls(self, ctx):
         guild_id = ctx.guild.id
-        if guild_id not in self.voice_clients or not self.voice_clients[guild_id].is_connected():
+        if not self.connected_player(guild_id):
             await ctx.send("Bot tidak berada di voice channel.")
             return
         embed = discord.Embed(
@@ -528,32 +1903,58 @@ class MusicCog(commands.Cog):
             )
         )
         view = AnimatedMusicControls(self, guild_id)
-        await ctx.send(embed=embed, view=view)
+        player = self.players[guild_id]
+        await player.delete_controls()
+        player.controls = (await ctx.send(embed=embed, view=view), view)
         logger.info(f"Displayed music controls in guild {guild_id}")
 
+    def listeners_changed(self, player):
+        if player.listeners > 0:
+            player.cancel_empty_timer()
+        elif player.empty_task is None:
+            player.empty_task = asyncio.create_task(self.leave_when_empty(player))
+
+    async def leave_when_empty(self, player):
+        # A grace period means a quick rejoin keeps the connection and the stream alive
+        await asyncio.sleep(EMPTY_CHANNEL_GRACE)
+        player.empty_task = None  # teardown must not cancel the task running it
+        if player.listeners == 0 and self.players.get(player.guild_id) is player:
+            await self.destroy_player(player.guild_id)
+            logger.info(f"Disconnected from voice channel in guild {player.guild_id} due to no human members")
+
+    def bot_moved(self, before, after):
+        # Our own connection joined, moved or left: re-index and count listeners once
+        if before.channel and self.channel_players.get(before.channel.id):
+            del self.channel_players[before.channel.id]
+        if after.channel is None:
+            return
+        player = self.players.get(after.channel.guild.id)
+        if player is None:
+            return
+        self.channel_players[after.channel.id] = player
+        player.listeners = sum(1 for m in after.channel.members if not m.bot)
+        self.listeners_changed(player)
+
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        if not member.bot:
-            for guild_id, vc in list(self.voice_clients.items()):
-                if vc.is_connected() and vc.channel:
-                    humans = [m for m in vc.channel.members if not m.bot]
-                    if len(humans) == 0:
-                        if guild_id in self.play_messages:
-                            try:
-                                await self.play_messages[guild_id].delete()
-                            except:
-                                pass
-                            self.play_messages.pop(guild_id, None)
-                        if guild_id in self.animation_tasks:
-                            self.animation_tasks[guild_id].cancel()
-                            self.animation_tasks.pop(guild_id, None)
-                        await vc.disconnect()
-                        self.voice_clients.pop(guild_id, None)
-                        self.queues.pop(guild_id, None)
-                        self.currents.pop(guild_id, None)
-                        self.loop_modes.pop(guild_id, None)
-                        self.volumes.pop(guild_id, None)
-                        logger.info(f"Disconnected from voice channel in guild {guild_id} due to no human members")
+        if before.channel == after.channel:
+            return  # mute, deafen and similar changes
+        if member.id == self.bot.user.id:
+            self.bot_moved(before, after)
+            return
+        if member.bot:
+            return
+        # Only the channels this event touches are looked at, never other guilds
+        if before.channel:
+            player = self.channel_players.get(before.channel.id)
+            if player:
+                player.listeners = max(0, player.listeners - 1)
+                self.listeners_changed(player)
+        if after.channel:
+            player = self.channel_players.get(after.channel.id)
+            if player:
+                player.listeners += 1
+                self.listeners_changed(player)
 
 async def setup_music_commands(bot):
-    await bot.add_cog(MusicCog(bot))
\ No newline at end of file
+    await bot.add_cog(MusicCog(bot))
@@ -0,0 +1,106 @@
+# packet_buffer.py
+import logging
+import os
+import threading
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+PACKET_BUFFER_MB = float(os.getenv('PACKET_BUFFER_MB', '16'))  # per guild, about 16 minutes of 128 kbps Opus
+PACKET_BUFFER_TOTAL_MB = float(os.getenv('PACKET_BUFFER_TOTAL_MB', '256'))  # across all guilds
+FRAME_LENGTH = 0.02  # seconds of audio per Opus packet
+END_TOLERANCE = 2.0  # seconds a complete recording may fall short of the reported duration
+
+
+class PacketBudget:
+    # Shared by every guild's buffer; appends happen on the audio threads
+    def __init__(self, limit=PACKET_BUFFER_TOTAL_MB * 1024 ** 2):
+        self.limit = int(limit)
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self.lock:
+            self.used -= size
+
+
+class PacketBuffer:
+    """Opus packets of one track, recorded from frame 0 as they are sent to Discord."""
+
+    def __init__(self, key, budget, duration=None, limit=PACKET_BUFFER_MB * 1024 ** 2):
+        self.key = key
+        self.duration = duration  # reported track length, None for unknown
+        self.budget = budget
+        self.limit = int(limit)
+        self.packets = []
+        self.size = 0
+        self.complete = False  # recorded up to the end of the track
+        self.recorder = None  # TrackSource currently appending, None once recording stopped
+
+    def __len__(self):
+        return len(self.packets)
+
+    @property
+    def usable(self):
+        return self.complete or self.recorder is not None
+
+    def append(self, packet):
+        size = len(packet)
+        if self.size + size > self.limit or not self.budget.reserve(size):
+            logger.info(f"Packet buffer for {self.key} is full, no longer recording")
+            self.release()
+            return
+        self.packets.append(packet)
+        self.size += size
+
+    def finish(self, clean):
+        # A pipeline that died mid-stream also ends in EOF; its truncated recording must not be replayed
+        recorded = len(self.packets) * FRAME_LENGTH
+        if not clean or (self.duration and recorded < self.duration - END_TOLERANCE):
+            logger.info(f"Recording of {self.key} ended early at {recorded:.0f}s, dropping it")
+            self.release()
+            return
+        self.complete = True
+        self.recorder = None
+
+    def release(self):
+        # Sources replaying this buffer keep their own reference to the packet list
+        self.recorder = None
+        self.complete = False
+        self.packets = []
+        size, self.size = self.size, 0
+        self.budget.release(size)
+
+
+class BufferedOpus(discord.AudioSource):
+    # Replays recorded packets from a frame index, then hands over to the pipeline that recorded them
+    def __init__(self, buffer, start, continuation=None):
+        self.packets = buffer.packets
+        self.index = start
+        self.end = len(buffer.packets)
+        self.continuation = continuation
+
+    def read(self):
+        if self.index < self.end:
+            packet = self.packets[self.index]
+            self.index += 1
+            return packet
+        if self.continuation:
+            return self.continuation.read()
+        return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self.continuation:
+            self.continuation.cleanup()
+            self.continuation = None
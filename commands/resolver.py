@@ -0,0 +1,115 @@
+# resolver.py
+import asyncio
+import functools
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# yt-dlp extraction is blocking network + JS work, so it runs in its own pool
+RESOLVER_WORKERS = int(os.getenv('RESOLVER_WORKERS', '4'))
+RESOLVER_QUEUE_SIZE = int(os.getenv('RESOLVER_QUEUE_SIZE', '32'))
+BACKGROUND_POLL = 0.25  # seconds a background job waits before re-checking for an idle worker
+
+
+class ResolverBusy(Exception):
+    pass
+
+
+class ResolverPool:
+    def __init__(self, workers=RESOLVER_WORKERS, max_pending=RESOLVER_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='resolver')
+        self.pending = 0  # jobs running or waiting for a worker, only touched from the event loop
+        # Bulk jobs (playlist pages) may hold at most half the workers between them
+        self.background = asyncio.Semaphore(max(1, self.workers // 2))
+
+    async def run(self, func, *args, **kwargs):
+        if self.pending >= self.max_pending:
+            logger.warning(f"Resolver queue full ({self.pending}/{self.max_pending}), rejecting job")
+            raise ResolverBusy("Bot sedang sibuk memproses lagu lain, coba lagi sebentar.")
+        return await self.submit(func, *args, **kwargs)
+
+    async def run_playback(self, func, *args, **kwargs):
+        # Never rejected: a track about to play waits for a worker instead of being skipped.
+        # One per playing guild at most, so these jobs can't pile up like user requests can
+        return await self.submit(func, *args, **kwargs)
+
+    async def run_background(self, func, *args, **kwargs):
+        # Never rejected, but only dispatched while a worker is idle so interactive lookups go first
+        async with self.background:
+            while self.pending >= self.workers:
+                await asyncio.sleep(BACKGROUND_POLL)
+            return await self.submit(func, *args, **kwargs)
+
+    async def submit(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        job = self.executor.submit(functools.partial(func, *args, **kwargs))
+        self.pending += 1
+        # A cancelled caller doesn't stop a job that already runs, so the worker counts as busy until it returns
+        job.add_done_callback(lambda _: self.job_done(loop))
+        return await asyncio.wrap_future(job)
+
+    def job_done(self, loop):
+        # Runs on the worker thread, or on the event loop when the job was cancelled before it started
+        try:
+            loop.call_soon_threadsafe(self.release)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def release(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("Resolver pool shut down")
+
+
+class YoutubeDLPool:
+    """Long-lived YoutubeDL instances, each used by one resolver thread at a time."""
+
+    def __init__(self, factory, size=RESOLVER_WORKERS):
+        self.factory = factory
+        self.size = max(1, size)
+        self.idle = queue.LifoQueue()  # most recently used instance has the warmest extractor state
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def warm_up(self):
+        while self.grow():
+            pass
+
+    def grow(self):
+        with self.lock:
+            if len(self.instances) >= self.size:
+                return False
+            ydl = self.factory()
+            self.instances.append(ydl)
+        self.idle.put(ydl)
+        return True
+
+    @contextmanager
+    def checkout(self):
+        try:
+            ydl = self.idle.get_nowait()
+        except queue.Empty:
+            # Instances that failed to warm up are created on first use instead
+            self.grow()
+            ydl = self.idle.get()
+        try:
+            yield ydl
+        finally:
+            self.idle.put(ydl)
+
+    def close(self):
+        for ydl in self.instances:
+            try:
+                ydl.close()
+            except Exception as e:
+                logger.error(f"Failed to close YoutubeDL instance: {e}")
+        self.instances.clear()
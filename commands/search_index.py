@@ -0,0 +1,174 @@
+# search_index.py
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+from collections import Counter, defaultdict
+
+from commands.atomic_write import cluster_path, write_atomic
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_SIZE = int(os.getenv('SEARCH_INDEX_SIZE', '5000'))  # tracks remembered for autocomplete
+SEARCH_INDEX_PATH = cluster_path(os.getenv('SEARCH_INDEX_PATH'))  # optional, enables on-disk persistence
+MAX_WORD_STARTS = 8  # a title is matchable from each of its first 8 words
+MAX_SCAN = 2000  # keys examined per lookup, keeps one-letter prefixes cheap
+GUILD_WEIGHT = 5  # one play in the asking guild counts as much as this many plays elsewhere
+CHOICE_LIMIT = 25  # Discord's maximum number of autocomplete choices
+EVICT_FRACTION = 0.05  # share of a full index forgotten at once
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.casefold()))
+
+
+class IndexEntry:
+    __slots__ = ('title', 'artist', 'query', 'plays', 'texts')
+
+    def __init__(self, title, artist, query, plays=0):
+        self.title = title
+        self.artist = artist
+        self.query = query
+        self.plays = plays
+        self.texts = []  # normalized strings this entry is stored under in SearchIndex.keys
+
+    def index_texts(self):
+        texts = set()
+        for value in (self.title, self.artist):
+            words = normalize(value or '').split()
+            for i in range(min(len(words), MAX_WORD_STARTS)):
+                texts.add(' '.join(words[i:]))
+        return sorted(texts)
+
+
+class SearchIndex:
+    """Prefix index over resolved track titles and artists, ranked by play counts."""
+
+    def __init__(self, max_entries=SEARCH_INDEX_SIZE, path=SEARCH_INDEX_PATH):
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self.entries = {}  # track key: IndexEntry
+        self.keys = []  # sorted (normalized text, track key)
+        self.guild_plays = defaultdict(Counter)  # guild_id: Counter of track key
+        self.evict_batch = max(1, int(self.max_entries * EVICT_FRACTION))
+        self.dirty = False
+        if self.path:
+            self.load()
+
+    def insert(self, key, entry):
+        entry.texts = entry.index_texts()
+        for text in entry.texts:
+            bisect.insort(self.keys, (text, key))
+        self.entries[key] = entry
+
+    def delete(self, key):
+        # Used when a track is re-added under a new title, so its play counts are kept
+        entry = self.entries.pop(key)
+        for text in entry.texts:
+            i = bisect.bisect_left(self.keys, (text, key))
+            if i < len(self.keys) and self.keys[i] == (text, key):
+                del self.keys[i]
+
+    def evict(self):
+        # Forgets the least played tracks a batch at a time, so the full scan it needs
+        # runs once per evict_batch new tracks instead of on every one
+        count = len(self.entries) - self.max_entries + self.evict_batch
+        victims = set(heapq.nsmallest(count, self.entries, key=lambda k: self.entries[k].plays))
+        for key in victims:
+            del self.entries[key]
+        self.keys = [item for item in self.keys if item[1] not in victims]
+        for guild_id in list(self.guild_plays):
+            plays = self.guild_plays[guild_id]
+            for key in plays.keys() & victims:
+                del plays[key]
+            if not plays:
+                del self.guild_plays[guild_id]
+
+    def add(self, key, title, artist, query):
+        entry = self.entries.get(key)
+        if entry:
+            if entry.title == title and entry.artist == artist:
+                return
+            self.delete(key)
+            entry = IndexEntry(title, artist, query, entry.plays)
+        else:
+            if len(self.entries) >= self.max_entries:
+                self.evict()
+            entry = IndexEntry(title, artist, query)
+        self.insert(key, entry)
+        self.dirty = True
+
+    def played(self, key, guild_id):
+        entry = self.entries.get(key)
+        if entry:
+            entry.plays += 1
+            self.guild_plays[guild_id][key] += 1
+            self.dirty = True
+
+    def score(self, key, guild_id):
+        plays = self.guild_plays.get(guild_id)
+        return self.entries[key].plays + GUILD_WEIGHT * (plays[key] if plays else 0)
+
+    def search(self, prefix, guild_id, limit=CHOICE_LIMIT):
+        """Return up to limit IndexEntry objects whose title or artist has a word starting with prefix."""
+        prefix = normalize(prefix)
+        if not prefix:
+            plays = self.guild_plays.get(guild_id)
+            candidates = [k for k, _ in plays.most_common(limit)] if plays else []
+            if len(candidates) < limit:
+                candidates += heapq.nlargest(limit, self.entries, key=lambda k: self.entries[k].plays)
+        else:
+            candidates = set()
+            start = bisect.bisect_left(self.keys, (prefix,))
+            for text, key in self.keys[start:start + MAX_SCAN]:
+                if not text.startswith(prefix):
+                    break
+                candidates.add(key)
+        ranked = heapq.nlargest(limit, set(candidates), key=lambda k: (self.score(k, guild_id), -len(self.entries[k].title)))
+        return [self.entries[k] for k in ranked]
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load search index from {self.path}: {e}")
+            return
+        # Only the entries are stored; the sorted key array is rebuilt from them
+        for key, title, artist, query, plays in data.get('entries', []):
+            entry = IndexEntry(title, artist, query, plays)
+            entry.texts = entry.index_texts()
+            self.entries[key] = entry
+            self.keys.extend((text, key) for text in entry.texts)
+        self.keys.sort()
+        for guild_id, plays in data.get('guild_plays', {}).items():
+            self.guild_plays[int(guild_id)] = Counter({k: n for k, n in plays.items() if k in self.entries})
+        logger.info(f"Loaded {len(self.entries)} search index entries from {self.path}")
+
+    def snapshot(self):
+        """Serialize the index on the event loop so the write can happen off it."""
+        if not self.path or not self.dirty:
+            return None
+        self.dirty = False
+        return json.dumps({
+            'entries': [[k, e.title, e.artist, e.query, e.plays] for k, e in self.entries.items()],
+            'guild_plays': {str(g): dict(plays) for g, plays in self.guild_plays.items() if plays},
+        }, separators=(',', ':'))
+
+    def write(self, data):
+        try:
+            write_atomic(self.path, data)
+        except OSError as e:
+            self.dirty = True
+            logger.error(f"Failed to save search index to {self.path}: {e}")
+
+    def save(self):
+        data = self.snapshot()
+        if data is not None:
+            self.write(data)
@@ -0,0 +1,97 @@
+# state_store.py
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'vydra_state.db')  # set to an empty string to disable
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '5'))  # seconds between write-behind flushes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_state (
+    guild_id INTEGER PRIMARY KEY,
+    voice_channel_id INTEGER,
+    text_channel_id INTEGER,
+    loop_mode INTEGER NOT NULL DEFAULT 0,
+    volume REAL NOT NULL DEFAULT 1.0,
+    queue_limit INTEGER,
+    current TEXT,
+    position REAL NOT NULL DEFAULT 0,
+    queue TEXT NOT NULL DEFAULT '[]',
+    updated_at REAL NOT NULL
+)
+"""
+
+UPSERT = """
+INSERT INTO guild_state (guild_id, voice_channel_id, text_channel_id, loop_mode, volume,
+                         queue_limit, current, position, queue, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(guild_id) DO UPDATE SET
+    voice_channel_id = excluded.voice_channel_id,
+    text_channel_id = excluded.text_channel_id,
+    loop_mode = excluded.loop_mode,
+    volume = excluded.volume,
+    queue_limit = excluded.queue_limit,
+    current = excluded.current,
+    position = excluded.position,
+    queue = excluded.queue,
+    updated_at = excluded.updated_at
+"""
+
+
+class StateStore:
+    """SQLite copy of guild player state, written behind the event loop in batches."""
+
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self.db = None
+        self.saved = {}  # guild_id: fingerprint of the last row written
+        self.lock = threading.Lock()  # the connection is shared by the flush thread and cog_unload
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def open(self):
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        # WAL keeps the file consistent if the process dies mid-write
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def load(self):
+        return [dict(row) for row in self.db.execute('SELECT * FROM guild_state')]
+
+    def write(self, upserts, positions, deletes):
+        # One transaction per flush; a final flush on unload waits for one still running in a thread
+        with self.lock:
+            if self.db is None:
+                return False
+            return self.commit(upserts, positions, deletes)
+
+    def commit(self, upserts, positions, deletes):
+        try:
+            with self.db:
+                if upserts:
+                    self.db.executemany(UPSERT, upserts)
+                if positions:
+                    self.db.executemany('UPDATE guild_state SET position = ?, updated_at = ? WHERE guild_id = ?', positions)
+                if deletes:
+                    self.db.executemany('DELETE FROM guild_state WHERE guild_id = ?', [(g,) for g in deletes])
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save guild state: {e}")
+            # Force the affected guilds to be written again on the next flush
+            for row in upserts:
+                self.saved.pop(row[0], None)
+            return False
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.db:
+                self.db.close()
+                self.db = None
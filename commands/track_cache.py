@@ -0,0 +1,144 @@
+# track_cache.py
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from commands.atomic_write import cluster_path, write_atomic
+
+logger = logging.getLogger(__name__)
+
+TRACK_CACHE_SIZE = int(os.getenv('TRACK_CACHE_SIZE', '1000'))
+TRACK_CACHE_PATH = cluster_path(os.getenv('TRACK_CACHE_PATH'))  # optional, enables on-disk persistence
+DEFAULT_TTL = 3600  # used when the stream URL carries no expire= parameter
+EXPIRY_MARGIN = 300  # stop serving a URL this long before googlevideo expires it
+
+VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})')
+
+
+def normalize_query(query):
+    return ' '.join(query.strip().lower().split())
+
+
+def extract_video_id(query):
+    match = VIDEO_ID_RE.search(query)
+    return match.group(1) if match else None
+
+
+def stream_expiry(url):
+    """Return the unix time a googlevideo stream URL stops working, or None."""
+    try:
+        parsed = urlparse(url)
+        expire = parse_qs(parsed.query).get('expire')
+        if expire:
+            return int(expire[0])
+        # Manifest style URLs carry the parameters in the path: /expire/<ts>/
+        parts = parsed.path.split('/')
+        if 'expire' in parts:
+            return int(parts[parts.index('expire') + 1])
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+class TrackCache:
+    """LRU cache of resolved track info keyed by normalized query and video ID."""
+
+    def __init__(self, max_size=TRACK_CACHE_SIZE, path=TRACK_CACHE_PATH):
+        self.max_size = max(1, max_size)
+        self.path = path
+        self.entries = OrderedDict()  # key: info dict with 'expires_at'
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self.load()
+
+    def key_for(self, query):
+        video_id = extract_video_id(query)
+        return f"id:{video_id}" if video_id else f"q:{normalize_query(query)}"
+
+    def get(self, query):
+        key = self.key_for(query)
+        info = self.entries.get(key)
+        if info is None:
+            self.misses += 1
+            return None
+        if info['expires_at'] - EXPIRY_MARGIN <= time.time():
+            self.drop(info)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return info
+
+    def put(self, query, info):
+        expires_at = stream_expiry(info['url']) or time.time() + DEFAULT_TTL
+        info = dict(info, expires_at=expires_at)
+        keys = [self.key_for(query)]
+        if info.get('id'):
+            keys.append(f"id:{info['id']}")
+        for key in keys:
+            self.entries[key] = info
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self.dirty = True
+        return info
+
+    def drop(self, info):
+        for key in [k for k, v in self.entries.items() if v is info]:
+            del self.entries[key]
+        self.dirty = True
+
+    def purge_expired(self):
+        now = time.time() + EXPIRY_MARGIN
+        for key in [k for k, v in self.entries.items() if v['expires_at'] <= now]:
+            del self.entries[key]
+            self.dirty = True
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load track cache from {self.path}: {e}")
+            return
+        # Entries sharing one info dict are stored once and relinked by index
+        infos = data.get('infos', [])
+        for key, index in data.get('keys', []):
+            self.entries[key] = infos[index]
+        self.purge_expired()
+        self.dirty = False
+        logger.info(f"Loaded {len(self.entries)} track cache entries from {self.path}")
+
+    def snapshot(self):
+        """Return the cache as JSON, or None if nothing changed since the last save."""
+        if not self.path or not self.dirty:
+            return None
+        self.purge_expired()
+        infos, index_of, keys = [], {}, []
+        for key, info in self.entries.items():
+            if id(info) not in index_of:
+                index_of[id(info)] = len(infos)
+                infos.append(info)
+            keys.append([key, index_of[id(info)]])
+        self.dirty = False
+        return json.dumps({'infos': infos, 'keys': keys})
+
+    def write(self, data):
+        try:
+            write_atomic(self.path, data)
+        except OSError as e:
+            self.dirty = True
+            logger.error(f"Failed to save track cache to {self.path}: {e}")
+
+    def save(self):
+        data = self.snapshot()
+        if data is not None:
+            self.write(data)
@@ -0,0 +1,129 @@
+# track_queue.py
+import itertools
+import os
+import random
+from collections import Counter, deque
+
+QUEUE_MAX_LENGTH = int(os.getenv('QUEUE_MAX_LENGTH', '1000'))  # upper bound for every guild's cap
+QUEUE_ALLOW_DUPLICATES = os.getenv('QUEUE_ALLOW_DUPLICATES', '1') != '0'
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DuplicateTrack(Exception):
+    pass
+
+
+class TrackQueue:
+    """Per-guild track queue with O(1) dequeue and requeue at both ends."""
+
+    def __init__(self, max_length=QUEUE_MAX_LENGTH, allow_duplicates=QUEUE_ALLOW_DUPLICATES):
+        self.items = deque()
+        self.keys = Counter()  # track key: number of queued copies
+        self.max_length = max(1, min(max_length, QUEUE_MAX_LENGTH))
+        self.allow_duplicates = allow_duplicates
+        self.total_duration = 0  # seconds, kept up to date on every add and remove
+        self.unknown_durations = 0  # live streams and tracks without a duration
+        self.version = 0  # bumped on every change, lets the state store skip unchanged queues
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    @staticmethod
+    def key_for(track):
+        # The stream URL changes whenever a track is resolved again, the video ID does not
+        return track.video_id or track.query
+
+    def contains(self, track):
+        return self.keys[self.key_for(track)] > 0
+
+    def check_space(self):
+        if len(self.items) >= self.max_length:
+            raise QueueFull(f"Antrian penuh (maksimal {self.max_length} lagu).")
+
+    def added(self, track):
+        self.version += 1
+        self.keys[self.key_for(track)] += 1
+        if track.duration:
+            self.total_duration += track.duration
+        else:
+            self.unknown_durations += 1
+
+    def removed(self, track):
+        self.version += 1
+        key = self.key_for(track)
+        self.keys[key] -= 1
+        if self.keys[key] <= 0:
+            del self.keys[key]
+        if track.duration:
+            self.total_duration -= track.duration
+        else:
+            self.unknown_durations -= 1
+
+    def page(self, start, stop):
+        return list(itertools.islice(self.items, start, stop))
+
+    def append(self, track, force=False):
+        # force is used when requeueing a track that just left the queue, so loops never hit the cap
+        if not force:
+            self.check_space()
+            if not self.allow_duplicates and self.contains(track):
+                raise DuplicateTrack(f"{track.title} sudah ada di antrian.")
+        self.items.append(track)
+        self.added(track)
+
+    def appendleft(self, track):
+        self.items.appendleft(track)
+        self.added(track)
+
+    def popleft(self):
+        track = self.items.popleft()
+        self.removed(track)
+        return track
+
+    def check_index(self, index):
+        if not 0 <= index < len(self.items):
+            raise IndexError(f"Posisi harus antara 1 dan {len(self.items)}.")
+
+    def remove(self, index):
+        # deque deletion rotates from the nearer end, so both ends of long queues stay cheap
+        self.check_index(index)
+        track = self.items[index]
+        del self.items[index]
+        self.removed(track)
+        return track
+
+    def move(self, source, destination):
+        self.check_index(source)
+        self.check_index(destination)
+        track = self.items[source]
+        del self.items[source]
+        self.items.insert(destination, track)
+        self.version += 1
+        return track
+
+    def shuffle(self):
+        # Random access into a deque is O(n), so shuffle a flat copy and refill in place
+        items = list(self.items)
+        random.shuffle(items)
+        self.items.clear()
+        self.items.extend(items)
+        self.version += 1
+
+    def clear(self):
+        self.version += 1
+        self.items.clear()
+        self.keys.clear()
+        self.total_duration = 0
+        self.unknown_durations = 0
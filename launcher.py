@@ -0,0 +1,107 @@
+# launcher.py
+import os
+import sys
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+import aiohttp
+from dotenv import load_dotenv
+from cluster_stats import ClusterStats
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "0")) or os.cpu_count() or 1
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))  # 0 asks Discord for the recommended count
+RESTART_DELAY = 10  # seconds before a crashed cluster is started again
+
+async def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards this bot should run."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"}
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+            return data["shards"]
+
+def run_cluster(cluster_id: int, shard_ids: list, shard_count: int, counts):
+    """Entry point of one cluster process: a full bot that only connects the given shards."""
+    os.environ["CLUSTER_ID"] = str(cluster_id)
+    os.environ["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    import vydra
+    vydra.cluster_stats = ClusterStats(counts, cluster_id)
+    asyncio.run(vydra.main())
+
+def split_shards(shard_count: int, clusters: int) -> list:
+    """Spread shard ids over clusters as evenly as possible, keeping them contiguous."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    groups, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+def main():
+    if TOKEN is None:
+        raise ValueError("⚠️ DISCORD_TOKEN is not set in environment variables")
+    shard_count = SHARD_COUNT or asyncio.run(recommended_shard_count(TOKEN))
+    groups = split_shards(shard_count, CLUSTER_COUNT)
+    counts = ClusterStats.allocate(len(groups))
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    stopping = False
+
+    def start(cluster_id):
+        process = context.Process(
+            target=run_cluster,
+            args=(cluster_id, groups[cluster_id], shard_count, counts),
+            name=f"cluster-{cluster_id}"
+        )
+        process.start()
+        processes[cluster_id] = process
+        logger.info(f"Started cluster {cluster_id} (pid {process.pid}) with shards {groups[cluster_id]}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Running {shard_count} shard(s) in {len(groups)} cluster(s)")
+    for cluster_id in range(len(groups)):
+        start(cluster_id)
+
+    restarts = {}  # cluster_id: time it may be started again
+    while not stopping:
+        time.sleep(1)
+        for cluster_id, process in list(processes.items()):
+            if process.is_alive() or stopping:
+                continue
+            if cluster_id not in restarts:
+                logger.error(f"Cluster {cluster_id} exited with code {process.exitcode}, restarting in {RESTART_DELAY}s")
+                restarts[cluster_id] = time.monotonic() + RESTART_DELAY
+            elif time.monotonic() >= restarts[cluster_id]:
+                del restarts[cluster_id]
+                start(cluster_id)
+
+    for process in processes.values():
+        process.join(timeout=30)
+        if process.is_alive():
+            process.kill()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
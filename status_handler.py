@@ -2,16 +2,50 @@
 import discord
 import random
 
-async def update_bot_status(bot):
-    statuses = [
-        {"type": discord.ActivityType.playing, "text": f"in {len(bot.guilds)} server!"},
-        {"type": discord.ActivityType.watching, "text": f"{sum(guild.member_count for guild in bot.guilds)} user!"},
-        {"type": discord.ActivityType.listening, "text": "Vibes 🎶🎶🎶"},
-        {"type": discord.ActivityType.playing, "text": "Vydra 🎶🎶🎶"},
-        {"type": discord.ActivityType.streaming, "text": "Hit Youtube! 🚀", "url": "https://www.youtube.com/"},
-        {"type": discord.ActivityType.watching, "text": "Create By @kyy-95631488", "url": "https://github.com/kyy-95631488/"}
-    ]
-    
-    status = random.choice(statuses)
-    activity = discord.Activity(type=status["type"], name=status["text"])
-    await bot.change_presence(activity=activity)
\ No newline at end of file
+# {guilds} and {members} are filled in from StatusCounters when a status is picked
+STATUSES = [
+    {"type": discord.ActivityType.playing, "text": "in {guilds} server!"},
+    {"type": discord.ActivityType.watching, "text": "{members} user!"},
+    {"type": discord.ActivityType.listening, "text": "Vibes 🎶🎶🎶"},
+    {"type": discord.ActivityType.playing, "text": "Vydra 🎶🎶🎶"},
+    {"type": discord.ActivityType.streaming, "text": "Hit Youtube! 🚀", "url": "https://www.youtube.com/"},
+    {"type": discord.ActivityType.watching, "text": "Create By @kyy-95631488", "url": "https://github.com/kyy-95631488/"}
+]
+
+class StatusCounters:
+    """Running guild and member totals, recounted on connect and updated on guild joins and leaves."""
+
+    def __init__(self):
+        self.guilds = 0
+        self.members = 0
+        self.last_presence = None  # (activity type, text) last sent to Discord
+
+    def reset(self, guilds):
+        # Full recount, only on (re)connect when the guild cache was rebuilt
+        self.guilds = len(guilds)
+        self.members = sum(guild.member_count or 0 for guild in guilds)
+
+    def guild_joined(self, guild):
+        self.guilds += 1
+        self.members += guild.member_count or 0
+
+    def guild_removed(self, guild):
+        self.guilds = max(0, self.guilds - 1)
+        self.members = max(0, self.members - (guild.member_count or 0))
+
+async def update_bot_status(bot, cluster_stats=None):
+    counters = bot.status_counters
+    guild_count, member_count = counters.guilds, counters.members
+    if cluster_stats:
+        # Publish this cluster's counts and show the totals of every cluster
+        cluster_stats.publish(guild_count, member_count)
+        guild_count, member_count = cluster_stats.totals()
+
+    status = random.choice(STATUSES)
+    text = status["text"].format(guilds=guild_count, members=member_count)
+    presence = (status["type"], text)
+    if presence == counters.last_presence:
+        return  # identical activity, not worth a gateway send
+    activity = discord.Activity(type=status["type"], name=text)
+    await bot.change_presence(activity=activity)
+    counters.last_presence = presence
@@ -1,13 +1,16 @@
 # vydra.py
 import os
+import json
+import hashlib
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 import asyncio
+import signal
 import aiohttp
 import logging
 from dotenv import load_dotenv
-from status_handler import update_bot_status
+from status_handler import update_bot_status, StatusCounters
 from commands.music import setup_music_commands
 
 # Configure logging
@@ -16,11 +19,17 @@ logging.basicConfig(level=logging.INFO)
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
+# Set by launcher.py for each cluster process; a plain `python vydra.py` lets Discord pick the shards
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id] or None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+cluster_stats = None  # ClusterStats shared with the other clusters, set by launcher.py
+COMMAND_TREE_HASH_PATH = os.getenv("COMMAND_TREE_HASH_PATH", ".command_tree_hash")
 
 # Set up Discord bot intents
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 
 async def check_token(token: str) -> bool:
     """Check if the provided Discord bot token is valid."""
@@ -65,35 +74,74 @@ def setup_badge_command(bot: commands.Bot):
 
     bot.tree.add_command(badge_group)
 
-@bot.event
-async def on_ready():
-    """Handle bot startup, command syncing, and initial setup."""
-    print(f"✅ Bot logged in as {bot.user}")
-    print("✔ Use this link to add your bot to your server: "
-          f"https://discord.com/api/oauth2/authorize?client_id={bot.user.id}&scope=applications.commands%20bot")
-    
+def command_tree_hash(tree: app_commands.CommandTree, application_id: int) -> str:
+    """Hash the command payload Discord would receive from tree.sync()."""
+    payload = []
+    for command in tree.get_commands():
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            payload.append(command.to_dict())  # discord.py < 2.4
+    payload.sort(key=lambda command: command["name"])
+    data = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+async def sync_command_tree(bot: commands.Bot):
+    """Sync global commands only when they differ from what was last synced."""
+    if CLUSTER_ID != 0:
+        return  # global commands belong to the application, one cluster syncing is enough
+    current_hash = command_tree_hash(bot.tree, bot.application_id)
+    try:
+        with open(COMMAND_TREE_HASH_PATH, "r", encoding="utf-8") as f:
+            stored_hash = f.read().strip()
+    except OSError:
+        stored_hash = None
+    if current_hash == stored_hash:
+        print("✅ Application commands unchanged, skipping sync")
+        return
+    synced = await bot.tree.sync()
+    print(f"✅ Synced {len(synced)} application command(s)")
+    try:
+        with open(COMMAND_TREE_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(current_hash)
+    except OSError as e:
+        logger.error(f"Failed to store command tree hash: {e}")
+
+async def setup_hook():
+    """Register cogs and commands once per process, before the gateway connects."""
     # Initialize badge activity tracking
     bot.badge_activity = {
         "last_command_time": None,
         "command_count": 0,
         "active_servers": set()
     }
-    
+    bot.status_counters = StatusCounters()
+
+    # Set up badge and music commands
+    setup_badge_command(bot)
+    await setup_music_commands(bot)
     try:
-        # Set up badge and music commands
-        setup_badge_command(bot)
-        await setup_music_commands(bot)
-        synced = await bot.tree.sync()
-        print(f"✅ Synced {len(synced)} application command(s)")
-        print("✔ Go to your Discord Server (where you added your bot) and use the slash command /active")
-        update_status.start()
+        await sync_command_tree(bot)
     except Exception as e:
-        print(f"⚠️ Failed to start status update task or sync commands: {e}")
+        print(f"⚠️ Failed to sync commands: {e}")
+
+bot.setup_hook = setup_hook
+
+@bot.event
+async def on_ready():
+    """Handle bot startup and reconnects; runs again after every gateway reconnect."""
+    print(f"✅ Bot logged in as {bot.user} (cluster {CLUSTER_ID}, shards {sorted(bot.shards)} of {bot.shard_count})")
+    print("✔ Use this link to add your bot to your server: "
+          f"https://discord.com/api/oauth2/authorize?client_id={bot.user.id}&scope=applications.commands%20bot")
+    print("✔ Go to your Discord Server (where you added your bot) and use the slash command /active")
+    bot.status_counters.reset(bot.guilds)
+    if not update_status.is_running():
+        update_status.start()
 
 @tasks.loop(seconds=30)
 async def update_status():
     """Periodically update the bot's status."""
-    await update_bot_status(bot)
+    await update_bot_status(bot, cluster_stats)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -104,6 +152,14 @@ async def on_command_error(ctx, error):
         print(f"⚠️ Error in command {ctx.command}: {error}")
         await ctx.send("❌ An error occurred while executing the command.")
 
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    bot.status_counters.guild_joined(guild)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    bot.status_counters.guild_removed(guild)
+
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
     """Track slash command interactions for badge activity."""
@@ -126,6 +182,11 @@ async def main():
         return
 
     print("\nRunning Discord Bot...")
+    try:
+        # Close cleanly on SIGTERM (host restarts, launcher shutdown) so cogs can flush their state
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except (NotImplementedError, RuntimeError):
+        pass  # not supported on Windows
     try:
         await bot.start(TOKEN)
     except Exception as e: